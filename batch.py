@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" batch.py - resolução em lote de várias instâncias em processos paralelos """
+
+import os, sys, glob, json, time, argparse, traceback
+import multiprocessing as mp
+from collections import deque
+from multiprocessing.connection import wait
+from data import load_items
+from heuristic import multifit, vnd
+
+
+#------------------------------------------------------------------------------#
+#   Processos de Trabalho                                                      #
+# -----------------------------------------------------------------------------#
+
+
+def solve_instance(file, taxrate=10, algo='auto', time_limit=None, keep_result=False):
+    """ Executa o fluxo completo (multifit + vnd) numa instância e retorna um
+    dicionário com o resumo do resultado """
+    start = time.perf_counter()
+    items = load_items(file)
+    initial = multifit(items=items, taxrate=taxrate)
+    remaining = None if time_limit is None else max(time_limit - (time.perf_counter() - start), 0)
+    final = vnd(initial, taxrate=taxrate, algo=algo, time_limit=remaining)
+    record = {'file': file, 'status': 'ok', 'items': len(items), 'initial_profit': initial.profit, \
+              'profit': final.profit, 'box_amount': final.box_amount, 'fit_order': final.fit_order, \
+              'sort_order': final.sort_order, 'time': time.perf_counter() - start}
+    if keep_result: record['result'] = final
+    return record
+
+
+def _worker(conn, options):
+    """ Recebe arquivos pelo próprio pipe até receber None, e devolve o
+    registro de cada um pelo mesmo pipe. Erros de uma instância viram um
+    registro de erro, sem derrubar o processo """
+    while True:
+        try: file = conn.recv()
+        except EOFError: break
+        if file is None: break
+        try:
+            record = solve_instance(file, **options)
+        except Exception as e: # um arquivo ruim não pode parar o lote
+            record = {'file': file, 'status': 'error', 'error': repr(e), \
+                      'traceback': traceback.format_exc()}
+        conn.send(record)
+
+
+#------------------------------------------------------------------------------#
+#   Lote                                                                       #
+# -----------------------------------------------------------------------------#
+
+
+def instance_files(source, pattern='*.txt'):
+    """ Lista de arquivos de um diretório (pelo padrão) ou de uma lista """
+    if isinstance(source, str):
+        if os.path.isdir(source): return sorted(glob.glob(os.path.join(source, pattern)))
+        return [source]
+    return list(source)
+
+
+def solve_batch(source, workers=None, timeout=None, taxrate=10, algo='auto', pattern='*.txt', \
+                soft_limit=0.8, keep_result=False):
+    """ Resolve várias instâncias em paralelo e gera (yield) o resumo de cada
+    uma assim que ela termina, na ordem em que terminarem.
+    Parametros:
+        source: diretório (com pattern) ou lista de arquivos
+        workers: número de processos (None = todos os núcleos)
+        timeout: tempo máximo por instância, em segundos. O vnd recebe
+                 soft_limit * timeout como orçamento e devolve a melhor solução
+                 até então; se a instância passar do timeout mesmo assim, o
+                 processo é encerrado, a instância é marcada 'timeout' e um novo
+                 processo assume o resto da fila
+    Um arquivo inválido ou um processo que morre geram um registro 'error' """
+    files = instance_files(source, pattern)
+    if not files: return
+    workers = min(workers or os.cpu_count() or 1, len(files))
+    options = {'taxrate': taxrate, 'algo': algo, 'keep_result': keep_result, \
+               'time_limit': None if timeout is None else timeout * soft_limit}
+    # a fila de trabalho fica no processo principal: cada trabalhador livre
+    # recebe o próximo arquivo pelo seu pipe, então sempre se sabe qual arquivo
+    # cada um tem, e encerrar um processo não corrompe uma fila compartilhada
+    pending = deque(range(len(files))) # índices dos arquivos ainda não enviados
+    procs, running = {}, {} # (processo, pipe) de cada trabalhador; (índice, início) em execução
+    reported = set() # índices dos arquivos já entregues
+    next_id = 0
+
+    def spawn():
+        nonlocal next_id
+        conn, child = mp.Pipe()
+        proc = mp.Process(target=_worker, args=(child, options), daemon=True)
+        proc.start()
+        child.close()
+        procs[next_id] = (proc, conn)
+        dispatch(next_id)
+        next_id += 1
+
+    def dispatch(wid): # próximo arquivo para um trabalhador livre, ou o encerra
+        proc, conn = procs[wid]
+        if pending:
+            index = pending.popleft()
+            conn.send(files[index])
+            running[wid] = (index, time.perf_counter())
+        else:
+            retire(wid)
+
+    def retire(wid, kill=False): # mensagens de um trabalhador retirado são ignoradas
+        proc, conn = procs.pop(wid)
+        running.pop(wid, None)
+        if kill and proc.is_alive(): proc.terminate()
+        elif not kill:
+            try: conn.send(None)
+            except OSError: pass
+        conn.close()
+        proc.join()
+        return proc.exitcode
+
+    def report(index, record): # cada arquivo é entregue uma única vez
+        if index in reported: return None
+        reported.add(index)
+        return record
+
+    for _ in range(workers): spawn()
+    try:
+        while len(reported) < len(files):
+            conns = {conn: wid for wid, (proc, conn) in procs.items()}
+            ready = wait(list(conns) + [procs[wid][0].sentinel for wid in procs], \
+                         timeout=None if timeout is None else 0.1)
+            for conn in [c for c in ready if c in conns]:
+                wid = conns[conn]
+                index, start = running[wid]
+                try: record = conn.recv()
+                except (EOFError, OSError): # o processo morreu sem responder
+                    code = retire(wid, kill=True)
+                    record = {'file': files[index], 'status': 'error', 'time': time.perf_counter() - start, \
+                              'error': 'processo encerrado com código ' + str(code)}
+                    if pending: spawn()
+                else:
+                    running.pop(wid)
+                    dispatch(wid)
+                record = report(index, record)
+                if record is not None: yield record
+            for sentinel in [s for s in ready if s not in conns]: # morreu sem fechar o pipe
+                for wid, (proc, conn) in list(procs.items()):
+                    if proc.sentinel == sentinel and not conn.poll():
+                        index, start = running[wid]
+                        code = retire(wid, kill=True)
+                        if pending: spawn()
+                        record = report(index, {'file': files[index], 'status': 'error', \
+                                                'time': time.perf_counter() - start, \
+                                                'error': 'processo encerrado com código ' + str(code)})
+                        if record is not None: yield record
+            now = time.perf_counter()
+            for wid, (index, start) in list(running.items()):
+                if timeout is not None and now - start > timeout and wid in procs:
+                    retire(wid, kill=True)
+                    if pending: spawn()
+                    record = report(index, {'file': files[index], 'status': 'timeout', 'time': now - start})
+                    if record is not None: yield record
+    finally:
+        for wid in list(procs): retire(wid, kill=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Resolução de instâncias em lote')
+    parser.add_argument('source', nargs='+', help='diretório ou arquivos de instância')
+    parser.add_argument('--pattern', default='*.txt')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--timeout', type=float, default=None)
+    parser.add_argument('--taxrate', type=int, default=10)
+    parser.add_argument('--algo', default='auto')
+    parser.add_argument('--output', help='arquivo JSON lines de saída (padrão: tela)')
+    args = parser.parse_args()
+
+    source = args.source[0] if len(args.source) == 1 else args.source
+    out = open(args.output, 'w') if args.output else sys.stdout
+    for record in solve_batch(source, args.workers, args.timeout, args.taxrate, args.algo, args.pattern):
+        record.pop('traceback', None)
+        out.write(json.dumps(record) + '\n'); out.flush()
+    if args.output: out.close()
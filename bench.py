@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" bench.py - benchmark das heurísticas de construção e das buscas de vizinhança """
+
+import sys, random, json, csv, time, platform, tracemalloc, argparse, io
+from contextlib import redirect_stdout
+from data import Result
+from heuristic import fit, multifit, nbhood, vnd, smarter_vnd, calc_profit
+from tests import generate_item_list, generate_pareto_list
+
+
+#-----------------------------------------------------------#
+# Configuração                                              #
+#-----------------------------------------------------------#
+
+SIZES = [100, 1000, 10000, 100000, 1000000]
+STAGES = ['fit:first', 'fit:best', 'fit:worst', 'fit:avoidtaxes', 'multifit', \
+          'nbhood', 'vnd', 'smarter_vnd']
+SEARCHES = ['nbhood', 'vnd', 'smarter_vnd'] # etapas que partem da solução do multifit
+""" maior instância em que cada etapa é executada: as buscas de vizinhança
+não terminam em tempo razoável nas instâncias gigantes """
+LIMITS = {'multifit': 100000, 'nbhood': 100000, 'vnd': 10000, 'smarter_vnd': 10000}
+FIELDS = ['stage', 'generator', 'size', 'seed', 'taxrate', 'time', 'peak_memory', \
+          'profit', 'box_amount']
+
+
+#-----------------------------------------------------------#
+# Instâncias                                                #
+#-----------------------------------------------------------#
+
+def make_instance(generator='normal', size=1000, seed=0):
+    """ Gera uma instância reprodutível com os geradores de tests.py """
+    random.seed(seed)
+    if generator == 'pareto':
+        return generate_pareto_list(amount=size, medium_size=400, medium_value=50, max_size=1000, max_value=100)
+    return generate_item_list(amount=size, max_size=1000, max_value=100)
+
+
+#-----------------------------------------------------------#
+# Execução                                                  #
+#-----------------------------------------------------------#
+
+def start_solution(stage, items, taxrate=10):
+    """ Solução inicial das buscas: a melhor do multifit, como em tests.test.
+    Construída fora da medição, para que o tempo e a memória de cada busca
+    não incluam os do multifit """
+    return multifit(items=items, taxrate=taxrate) if stage in SEARCHES else None
+
+
+def run_stage(stage, items, taxrate=10, start=None):
+    """ Executa uma etapa e retorna o Result produzido. As buscas partem de
+    start (start_solution) """
+    if stage.startswith('fit:'):
+        f = stage.split(':')[1]
+        boxes = fit(items, fit=f)
+        return Result(list_of_boxes=boxes, fit_order=f, profit=calc_profit(boxes, taxrate), box_amount=len(boxes))
+    if stage == 'multifit': return multifit(items=items, taxrate=taxrate)
+    if stage == 'nbhood': return nbhood(start, taxrate=taxrate)
+    if stage == 'vnd': return vnd(start, taxrate=taxrate)
+    if stage == 'smarter_vnd':
+        # a lista que o smarter_vnd devolve é a que sobrou do backtracking, não
+        # a melhor solução vista: ela é guardada a cada melhoria pelo on_improve
+        solutions = nbhood(start, taxrate=taxrate, meta=True)
+        best = [max([start] + solutions[:1], key=lambda r: r.profit)]
+        def keep(solution):
+            if solution.profit > best[0].profit: best[0] = solution
+        with redirect_stdout(io.StringIO()): # smarter_vnd imprime cada backtracking
+            smarter_vnd(solutions, taxrate=taxrate, on_improve=keep)
+        return best[0]
+    raise ValueError("etapa desconhecida: " + str(stage))
+
+
+def measure(stage, items, taxrate=10, memory=True):
+    """ Mede o tempo de relógio de uma etapa e, numa segunda execução sob o
+    tracemalloc (que deixa o código mais lento), o pico de memória. A solução
+    inicial das buscas é construída antes, fora das duas medições """
+    start = start_solution(stage, items, taxrate)
+    begin = time.perf_counter()
+    result = run_stage(stage, items, taxrate, start)
+    elapsed = time.perf_counter() - begin
+    peak = None
+    if memory:
+        tracemalloc.start()
+        run_stage(stage, items, taxrate, start)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return elapsed, peak, result
+
+
+def benchmark(sizes=SIZES, stages=STAGES, generators=('normal',), seed=0, taxrate=10, \
+              limits=LIMITS, memory=True, verbose=True):
+    """ Roda todas as etapas em todos os tamanhos e retorna a lista de medições """
+    records = []
+    for generator in generators:
+        for size in sizes:
+            items = make_instance(generator, size, seed)
+            for stage in stages:
+                if size > limits.get(stage, size): continue
+                elapsed, peak, result = measure(stage, items, taxrate, memory)
+                record = {'stage': stage, 'generator': generator, 'size': size, 'seed': seed, \
+                          'taxrate': taxrate, 'time': elapsed, 'peak_memory': peak, \
+                          'profit': result.profit, 'box_amount': result.box_amount}
+                records.append(record)
+                if verbose:
+                    print("%-16s %-7s %8d %9.3fs %12s %10d %7d" % (stage, generator, size, elapsed, \
+                          '-' if peak is None else str(peak // 1024) + 'KiB', result.profit, result.box_amount))
+    return records
+
+
+#-----------------------------------------------------------#
+# Exportação e Comparação                                   #
+#-----------------------------------------------------------#
+
+def save_json(records, file):
+    """ Salva as medições com os metadados do ambiente """
+    meta = {'python': platform.python_version(), 'platform': platform.platform(), \
+            'date': time.strftime('%Y-%m-%d %H:%M:%S')}
+    with open(file, 'w') as f: json.dump({'meta': meta, 'records': records}, f, indent=1)
+
+
+def save_csv(records, file):
+    """ Salva as medições como CSV """
+    with open(file, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDS)
+        writer.writeheader()
+        writer.writerows(records)
+
+
+def compare(old_file, new_file, time_tolerance=0.2, min_time=0.01):
+    """ Compara duas execuções salvas em JSON e retorna as regressões: etapas
+    mais lentas que a tolerância (ignorando diferenças abaixo de min_time
+    segundos, que são ruído), ou com lucro menor que antes """
+    def load(file):
+        with open(file) as f: records = json.load(f)['records']
+        return {(r['stage'], r['generator'], r['size'], r['seed'], r['taxrate']): r for r in records}
+    old, new = load(old_file), load(new_file)
+    regressions = []
+    for key in sorted(set(old) & set(new), key=str):
+        o, n = old[key], new[key]
+        if n['time'] > o['time'] * (1 + time_tolerance) and n['time'] - o['time'] > min_time:
+            regressions.append((key, 'time', o['time'], n['time']))
+        if n['profit'] < o['profit']:
+            regressions.append((key, 'profit', o['profit'], n['profit']))
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark das heurísticas')
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES)
+    parser.add_argument('--stages', nargs='+', default=STAGES, choices=STAGES)
+    parser.add_argument('--generators', nargs='+', default=['normal'], choices=['normal', 'pareto'])
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--taxrate', type=int, default=10)
+    parser.add_argument('--no-memory', action='store_true', help='não mede o pico de memória')
+    parser.add_argument('--json', help='arquivo de saída JSON')
+    parser.add_argument('--csv', help='arquivo de saída CSV')
+    parser.add_argument('--compare', nargs=2, metavar=('ANTIGO', 'NOVO'), help='compara dois JSON')
+    args = parser.parse_args()
+
+    if args.compare:
+        found = compare(*args.compare)
+        for key, kind, before, after in found: print(key, kind, before, '->', after)
+        sys.exit(1 if found else 0)
+    records = benchmark(args.sizes, args.stages, args.generators, args.seed, args.taxrate, \
+                        memory=not args.no_memory)
+    if args.json: save_json(records, args.json)
+    if args.csv: save_csv(records, args.csv)
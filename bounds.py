@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" bounds.py - limitantes do número de caixas e do lucro, para saber quando
+uma solução já é comprovadamente boa """
+
+import math
+from bisect import bisect_left, bisect_right
+from itertools import accumulate
+from data import PackedSolution
+
+
+EPS = 1e-9 # folga para os arredondamentos de ponto flutuante nos floor()
+
+
+#------------------------------------------------------------------------------#
+#   Número de Caixas                                                           #
+# -----------------------------------------------------------------------------#
+
+
+def l1_bound(sizes, box_size=1000):
+    """ L1: espaço total dividido pelo tamanho da caixa, arredondado para cima """
+    return -(-sum(sizes) // box_size)
+
+
+def l2_bound(sizes, box_size=1000):
+    """ L2 de Martello e Toth: para cada K <= C/2, os itens maiores que C-K
+    ficam sozinhos, os maiores que C/2 ficam um por caixa, e os entre K e
+    C/2 só podem usar a sobra das caixas dos médios. O(n log n) com a lista
+    ordenada e somas de prefixo """
+    s = sorted(sizes)
+    if not s: return 0
+    prefix = [0] + list(accumulate(s))
+    C = box_size
+
+    def count_sum(low, high): # itens com low < tamanho <= high
+        a, b = bisect_right(s, low), bisect_right(s, high)
+        return b - a, prefix[b] - prefix[a]
+
+    best = l1_bound(s, C)
+    half = C // 2
+    for K in sorted(set([0] + [x for x in s if x <= half])):
+        big = count_sum(C - K, float('inf'))[0]
+        mid, mid_sum = count_sum(half, C - K)
+        a = bisect_left(s, K)
+        small_sum = prefix[bisect_right(s, half)] - prefix[a]
+        spare = mid * C - mid_sum
+        bound = big + mid + max(0, -(-(small_sum - spare) // C))
+        if bound > best: best = bound
+    return best
+
+
+#------------------------------------------------------------------------------#
+#   Lucro                                                                      #
+# -----------------------------------------------------------------------------#
+
+
+class Bounds:
+    """ Bounds (Classe): limitantes de uma instância para uma função objetivo.
+    min_boxes é o maior entre L1 e L2; profit_upper é um limitante superior
+    do lucro de qualquer solução (nenhuma solução passa dele) """
+
+    def __init__(self, total_size, total_value, l1, l2, profit_upper, best_boxes):
+        self.total_size = total_size
+        self.total_value = total_value
+        self.l1 = l1
+        self.l2 = l2
+        self.min_boxes = max(l1, l2)
+        self.profit_upper = profit_upper
+        self.best_boxes = best_boxes # número de caixas onde o limitante do lucro é atingido
+
+    def gap(self, profit):
+        """ Distância relativa do lucro até o limitante superior """
+        if profit >= self.profit_upper: return 0.0
+        return (self.profit_upper - profit) / abs(self.profit_upper) if self.profit_upper else float('inf')
+
+    def reached(self, profit, gap=0.0):
+        """ Se o lucro já está a no máximo gap (fração) do limitante """
+        return self.gap(profit) <= (gap or 0.0)
+
+    def print_bounds(self):
+        print("Caixas >= " + str(self.min_boxes) + " (L1: " + str(self.l1) + ", L2: " + str(self.l2) + ")" + \
+              " Lucro <= " + str(self.profit_upper) + " (com " + str(self.best_boxes) + " caixas)")
+
+
+def cost_bound(boxes, total_size, base_box_cost=5, box_rate=0.005):
+    """ Menor custo possível de boxes caixas guardando total_size no total.
+    Cada caixa custa int(base + rate * usado) > base + rate * usado - 1,
+    então a soma passa de T - boxes, onde T = boxes * base + rate * total_size;
+    e cada uma custa também pelo menos int(base) """
+    T = boxes * base_box_cost + box_rate * total_size
+    return max(boxes * int(base_box_cost), math.floor(T - boxes - EPS) + 1 if boxes else 0)
+
+
+def tax_bound(boxes, expensive_value, cheap_value, expensive_tax, expensive_boxes, taxrate=10, min_tax=50):
+    """ Menor taxação possível com boxes caixas. Itens acima do min_tax pagam
+    pelo menos a própria taxa (o int() é superaditivo); os baratos só ficam
+    sem taxa em caixas sem itens caros, cada uma com até min_tax de valor.
+    O valor restante é taxado, e a soma dos int() passa de taxa - caixas """
+    untaxed = max(boxes - expensive_boxes, 0)
+    taxed_value = expensive_value + max(0, cheap_value - untaxed * min_tax)
+    spread = math.floor((taxed_value / 100) * taxrate - boxes - EPS) + 1 if taxed_value and boxes else 0
+    return max(expensive_tax, spread, 0)
+
+
+def compute_bounds(items, taxrate=10, min_tax=50, base_box_cost=5, box_rate=0.005, box_size=1000):
+    """ Limitantes de uma lista de itens em O(n log n): o número mínimo de
+    caixas (L1/L2) e o maior lucro possível. O lucro é o valor total menos
+    custo e taxação; mais caixas custam mais mas permitem taxar menos, então
+    o limitante é o maior entre todos os números de caixas possíveis """
+    return bounds_from_columns([i.size for i in items], [i.value for i in items], \
+                               taxrate, min_tax, base_box_cost, box_rate, box_size)
+
+
+def bounds_from_columns(sizes, values, taxrate=10, min_tax=50, base_box_cost=5, box_rate=0.005, box_size=1000):
+    """ compute_bounds a partir das colunas de tamanhos e valores """
+    n = len(sizes)
+    total_size, total_value = sum(sizes), sum(values)
+    l1, l2 = l1_bound(sizes, box_size), l2_bound(sizes, box_size)
+    expensive_value = expensive_tax = 0
+    expensive_sizes = []
+    for sz, vl in zip(sizes, values):
+        if vl > min_tax:
+            expensive_value += vl
+            expensive_tax += int((vl / 100) * taxrate - EPS)
+            expensive_sizes.append(sz)
+    cheap_value = total_value - expensive_value
+    expensive_boxes = l1_bound(expensive_sizes, box_size)
+    best, best_boxes = None, 0
+    # o custo cresce e a taxação cai com o número de caixas; os dois são O(1)
+    for boxes in range(max(l1, l2), n + 1):
+        profit = total_value - cost_bound(boxes, total_size, base_box_cost, box_rate) \
+                 - tax_bound(boxes, expensive_value, cheap_value, expensive_tax, expensive_boxes, taxrate, min_tax)
+        if best is None or profit > best: best, best_boxes = profit, boxes
+        if total_value - boxes * int(base_box_cost) - expensive_tax < best:
+            break # nem sem custo variável e só com a taxa dos caros daria para passar do melhor
+    if best is None: best = 0
+    return Bounds(total_size, total_value, l1, l2, best, best_boxes)
+
+
+def solution_bounds(boxes, taxrate=10, min_tax=50, base_box_cost=5, box_rate=0.005):
+    """ Limitantes dos itens de uma solução (lista de Box ou PackedSolution) """
+    if isinstance(boxes, PackedSolution):
+        return bounds_from_columns(list(boxes.sizes), list(boxes.values), taxrate, min_tax, \
+                                   base_box_cost, box_rate, boxes.box_size)
+    box_size = boxes[0].total_size if boxes else 1000
+    sizes = [m.size for b in boxes for m in b.items]
+    values = [m.value for b in boxes for m in b.items]
+    return bounds_from_columns(sizes, values, taxrate, min_tax, base_box_cost, box_rate, box_size)
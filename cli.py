@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" cli.py - linha de comando. Cada subcomando importa só os módulos que usa,
+para que a inicialização seja rápida """
+
+import argparse
+
+
+#------------------------------------------------------------------------------#
+#   Subcomandos                                                                #
+# -----------------------------------------------------------------------------#
+
+
+def cmd_solve(args):
+    """ multifit + vnd (ou multistart_vnd) numa instância """
+    from data import load_items
+    from heuristic import multifit, vnd, multistart_vnd, alns
+    items = load_items(args.file)
+    if args.multistart:
+        result = multistart_vnd(items=items, taxrate=args.taxrate, workers=args.workers, \
+                                algo=args.algo, time_limit=args.time_limit)
+    else:
+        result = vnd(multifit(items=items, taxrate=args.taxrate, gap=args.gap), taxrate=args.taxrate, \
+                     algo=args.algo, time_limit=args.time_limit, gap=args.gap)
+    if args.alns: result = alns(result, taxrate=args.taxrate, iterations=args.alns, gap=args.gap)
+    result.print_result()
+    if args.save:
+        with open(args.save, 'wb') as f: f.write(result.to_bytes())
+
+
+def cmd_show(args):
+    """ Imprime um resultado salvo com solve --save """
+    from data import Result
+    with open(args.file, 'rb') as f: result = Result.from_bytes(f.read())
+    result.print_result()
+    if args.boxes:
+        for b in result.list_of_boxes: print(str(b.used_size) + '-' + str(b.total_value), end='|')
+        print()
+
+
+def cmd_bounds(args):
+    """ Limitantes do número de caixas e do lucro """
+    from data import load_items
+    from bounds import compute_bounds
+    compute_bounds(load_items(args.file), taxrate=args.taxrate).print_bounds()
+
+
+def cmd_exact(args):
+    """ Branch and bound, com o gap se o tempo acabar """
+    from data import load_items
+    from exact import solve
+    solve(load_items(args.file), taxrate=args.taxrate, time_limit=args.time_limit, verbose=True)
+
+
+def cmd_batch(args):
+    """ Várias instâncias em paralelo, uma linha JSON por instância """
+    import json
+    from batch import solve_batch
+    source = args.source[0] if len(args.source) == 1 else args.source
+    for record in solve_batch(source, args.workers, args.timeout, args.taxrate, args.algo, args.pattern):
+        record.pop('traceback', None)
+        print(json.dumps(record), flush=True)
+
+
+def cmd_convert(args):
+    """ Converte uma instância JSON para o formato binário """
+    from data import convert_to_binary
+    convert_to_binary(args.file, args.output)
+
+
+#------------------------------------------------------------------------------#
+#   Argumentos                                                                 #
+# -----------------------------------------------------------------------------#
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='cli.py', description='O Problema do Importador')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    p = commands.add_parser('solve', help='multifit + vnd numa instância')
+    p.add_argument('file')
+    p.add_argument('--taxrate', type=int, default=10)
+    p.add_argument('--algo', default='auto', choices=['auto', 'top_to_bottom', 'repack'])
+    p.add_argument('--time-limit', type=float, default=None)
+    p.add_argument('--gap', type=float, default=None, help='para a essa fração do limitante')
+    p.add_argument('--multistart', action='store_true', help='usa o multistart_vnd')
+    p.add_argument('--workers', type=int, default=None)
+    p.add_argument('--alns', type=int, default=0, metavar='N', help='N iterações de ALNS no fim')
+    p.add_argument('--save', help='salva o resultado (Result.to_bytes)')
+    p.set_defaults(run=cmd_solve)
+
+    p = commands.add_parser('show', help='mostra um resultado salvo')
+    p.add_argument('file')
+    p.add_argument('--boxes', action='store_true')
+    p.set_defaults(run=cmd_show)
+
+    p = commands.add_parser('bounds', help='limitantes de caixas e lucro')
+    p.add_argument('file')
+    p.add_argument('--taxrate', type=int, default=10)
+    p.set_defaults(run=cmd_bounds)
+
+    p = commands.add_parser('exact', help='solução exata por branch and bound')
+    p.add_argument('file')
+    p.add_argument('--taxrate', type=int, default=10)
+    p.add_argument('--time-limit', type=float, default=10)
+    p.set_defaults(run=cmd_exact)
+
+    p = commands.add_parser('batch', help='várias instâncias em paralelo')
+    p.add_argument('source', nargs='+')
+    p.add_argument('--pattern', default='*.txt')
+    p.add_argument('--workers', type=int, default=None)
+    p.add_argument('--timeout', type=float, default=None)
+    p.add_argument('--taxrate', type=int, default=10)
+    p.add_argument('--algo', default='auto')
+    p.set_defaults(run=cmd_batch)
+
+    p = commands.add_parser('convert', help='converte uma instância para binário')
+    p.add_argument('file')
+    p.add_argument('output')
+    p.set_defaults(run=cmd_convert)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    args.run(args)
+
+
+if __name__ == '__main__':
+    main()
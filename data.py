@@ -3,7 +3,10 @@
 
 """ data.py - classes e funções de carregamento/exportação """
 
-import sys, random, json
+import sys, random, json, mmap, struct
+from time import perf_counter
+from array import array
+from collections import OrderedDict, deque
 
 
 #------------------------------------------------------------------------------#
@@ -13,6 +16,7 @@ import sys, random, json
 
 class Item:
     """ Item (Classe): cada item a ser guardado """
+    __slots__ = ('size', 'value')
 
     def __init__(self, size, value):
         self.size = size
@@ -20,6 +24,8 @@ class Item:
 
 class Box:
     """ Box (Classe): cada caixa onde serão armazenados os items """
+    __slots__ = ('total_size', 'used_size', 'total_value', 'items')
+
     def __init__(self, size=1000):
         self.total_size = size
         self.used_size = 0
@@ -32,6 +38,27 @@ class Box:
         self.used_size += item.size
         self.total_value += item.value
 
+    def remove_item(self, item):
+        """ Remove um item da caixa (o próprio objeto, ou o primeiro de mesmo
+        tamanho e valor), e atualiza seus valores. Retorna o item removido """
+        for k, m in enumerate(self.items):
+            if m is item: break
+        else:
+            for k, m in enumerate(self.items):
+                if m.size == item.size and m.value == item.value: break
+            else: raise ValueError("item não está na caixa")
+        m = self.items.pop(k)
+        self.used_size -= m.size
+        self.total_value -= m.value
+        return m
+
+    def copy(self):
+        """ Cópia rasa da caixa: nova lista de itens, mesmos objetos Item """
+        new_box = Box(self.total_size)
+        new_box.items = list(self.items)
+        new_box.used_size, new_box.total_value = self.used_size, self.total_value
+        return new_box
+
     def can_add(self, item):
         """ Verifica se pode adicionar item na caixa, retorna True se verdade"""
         return True if self.used_size + item.size <= self.total_size else False
@@ -50,16 +77,150 @@ class Box:
             box_rate: um valor que varia de acordo com o peso da caixa
             tax_rate: valor da taxa de imposto
             min_tax: tamanho máximo de caixa para que não seja taxada """
-        box_cost = int(base_box_cost + (box_rate * self.used_size))
-        if self.total_value <= min_tax:
-            profit = self.total_value - box_cost
-          #  print("sem taxa: " + str(box_cost) + '--' + str(profit))
-        else:   
-            taxation = (self.total_value / 100) * tax_rate
-            profit = self.total_value - int(taxation) - box_cost
-           # print("taxado: "+ str(taxation) + "-" + str(box_cost) + "--" +
-           # str(self.total_value) + "= " + str(profit))
-        return profit
+        return box_profit(self.used_size, self.total_value, base_box_cost, \
+                          box_rate, tax_rate, min_tax)
+
+
+def box_profit(used_size, total_value, base_box_cost=5, box_rate=0.005, \
+               tax_rate=10, min_tax=50):
+    """ Lucro de uma caixa a partir apenas do seu espaço usado e valor total,
+    sem precisar de um objeto Box (usado na avaliação por delta) """
+    box_cost = int(base_box_cost + (box_rate * used_size))
+    if total_value <= min_tax:
+        profit = total_value - box_cost
+    else:
+        taxation = (total_value / 100) * tax_rate
+        profit = total_value - int(taxation) - box_cost
+    return profit
+
+
+class PackedSolution:
+    """ PackedSolution (Classe): solução compacta, guardada em colunas (array)
+    em vez de objetos Box com listas de Item. Os tamanhos e valores dos itens
+    são compartilhados entre as cópias; cada solução tem apenas o vetor
+    item -> caixa, a ordem de inserção dos itens e os totais de cada caixa.
+    As caixas são numeradas na ordem da lista (0 .. len-1) """
+    __slots__ = ('sizes', 'values', 'items', 'box_size', 'assign', 'rank', \
+                 'used', 'value', 'seq')
+
+    def __init__(self, sizes, values, box_size=1000, items=None):
+        self.sizes = sizes if isinstance(sizes, array) else array('i', sizes)
+        self.values = values if isinstance(values, array) else array('i', values)
+        self.items = items # lista de Item original (opcional), usada em to_boxes
+        self.box_size = box_size
+        self.assign = array('i', [-1]) * len(self.sizes) # caixa de cada item
+        self.rank = array('i', range(len(self.sizes))) # ordem do item dentro da caixa
+        self.seq = len(self.sizes)
+        self.used = array('i') # espaço usado de cada caixa
+        self.value = array('i') # valor total de cada caixa
+
+    def __len__(self):
+        return len(self.used)
+
+    def copy(self):
+        """ Cópia barata: apenas os vetores da solução são copiados """
+        new = PackedSolution.__new__(PackedSolution)
+        new.sizes, new.values, new.items = self.sizes, self.values, self.items
+        new.box_size, new.seq = self.box_size, self.seq
+        new.assign, new.rank = self.assign[:], self.rank[:]
+        new.used, new.value = self.used[:], self.value[:]
+        return new
+
+    def new_box(self):
+        """ Cria uma caixa vazia no fim da lista, retorna seu número """
+        self.used.append(0); self.value.append(0)
+        return len(self.used) - 1
+
+    def add_item(self, i, box):
+        """ Coloca o item i na caixa, (re)tirando-o da caixa anterior """
+        old = self.assign[i]
+        if old >= 0:
+            self.used[old] -= self.sizes[i]; self.value[old] -= self.values[i]
+        self.assign[i] = box
+        self.used[box] += self.sizes[i]; self.value[box] += self.values[i]
+        self.rank[i] = self.seq; self.seq += 1 # o item vai para o fim da caixa
+
+    def members(self, boxes=None):
+        """ Itens de cada caixa (ou só das caixas informadas), na ordem em
+        que foram inseridos. Retorna um dicionário caixa -> lista de itens """
+        wanted = None if boxes is None else set(boxes)
+        groups = {b: [] for b in (range(len(self.used)) if boxes is None else boxes)}
+        for i in sorted(range(len(self.assign)), key=self.rank.__getitem__):
+            b = self.assign[i]
+            if b >= 0 and (wanted is None or b in wanted): groups[b].append(i)
+        return groups
+
+    def profit(self, base_box_cost=5, box_rate=0.005, tax_rate=10, min_tax=50):
+        """ Função de avaliação sobre os totais de cada caixa """
+        return sum(box_profit(u, v, base_box_cost, box_rate, tax_rate, min_tax) \
+                   for u, v in zip(self.used, self.value))
+
+    def split(self, order, pos):
+        """ Nova solução com a caixa order[pos] partida em duas metades, que
+        vão para o fim da lista (mesma semântica do top_to_bottom) """
+        new = self.copy()
+        box = order[pos]
+        inside = new.members([box])[box]
+        half1, half2 = new.new_box(), new.new_box()
+        for i in inside[:len(inside)//2]: new.add_item(i, half1)
+        for i in inside[len(inside)//2:]: new.add_item(i, half2)
+        new._renumber(order[:pos] + order[pos+1:] + [half1, half2])
+        return new
+
+    def merge(self, order, pos, merged):
+        """ Nova solução com as caixas order[merged] juntadas na caixa
+        order[pos], que vai para o fim da lista (mesma semântica do repack) """
+        new = self.copy()
+        target = order[pos]
+        groups = new.members([target] + [order[m] for m in merged])
+        for m in merged:
+            for i in groups[order[m]]: new.add_item(i, target)
+        removed = set(merged); removed.add(pos)
+        new_order = [b for k, b in enumerate(order) if k not in removed]
+        if any(groups.values()): new_order.append(target)
+        new._renumber(new_order)
+        return new
+
+    def _renumber(self, order):
+        """ Renumera as caixas segundo a ordem dada, descartando as omitidas """
+        mapping = array('i', [-1]) * len(self.used)
+        for k, b in enumerate(order): mapping[b] = k
+        self.assign = array('i', [mapping[a] if a >= 0 else -1 for a in self.assign])
+        self.used = array('i', [self.used[b] for b in order])
+        self.value = array('i', [self.value[b] for b in order])
+
+    @classmethod
+    def from_assignment(cls, items, assign, order, box_size=1000):
+        """ Monta a solução a partir da alocação item -> id de caixa e da
+        ordem final dos ids (saída do motor do fit) """
+        solution = cls([i.size for i in items], [i.value for i in items], box_size, items)
+        for _ in order: solution.new_box()
+        position = {b: k for k, b in enumerate(order)}
+        for i, b in enumerate(assign):
+            solution.add_item(i, position[b])
+        return solution
+
+    @classmethod
+    def from_boxes(cls, boxes):
+        """ Adaptador: converte uma lista de Box em uma PackedSolution """
+        items = [i for b in boxes for i in b.items]
+        box_size = boxes[0].total_size if boxes else 1000
+        solution = cls([i.size for i in items], [i.value for i in items], box_size, items)
+        k = 0
+        for b in boxes:
+            box = solution.new_box()
+            for _ in b.items: solution.add_item(k, box); k += 1
+        return solution
+
+    def to_boxes(self):
+        """ Adaptador: converte a solução de volta para uma lista de Box """
+        boxes = [Box(self.box_size) for _ in self.used]
+        groups = self.members()
+        for b, inside in groups.items():
+            for i in inside:
+                item = self.items[i] if self.items is not None else Item(self.sizes[i], self.values[i])
+                boxes[b].add_item(item)
+        return boxes
 
 
 class Result:
@@ -67,7 +228,7 @@ class Result:
     das buscas de vizinhança """
 
     def __init__(self,list_of_boxes='',fit_order='',sort_order='',nb_algo='',\
-                 nb_order='',nb_pos='',box_amount='', profit=''):
+                 nb_order='',nb_pos='',box_amount='', profit='', stats=None):
         self.list_of_boxes =list_of_boxes
         self.fit_order = fit_order
         self.sort_order = sort_order
@@ -76,6 +237,7 @@ class Result:
         self.nb_pos = nb_pos
         self.box_amount = box_amount
         self.profit = profit
+        self.stats = stats # SearchStats da busca que gerou o resultado (opcional)
 
 
     def print_result_h(self):
@@ -89,8 +251,195 @@ class Result:
         str(self.nb_algo) + ',' + str(self.nb_order) + ',' + str(self.nb_pos) \
         + '/' + str(self.fit_order) + ',' + str(self.sort_order)+ ' ')
 
-        
-        
+    def to_bytes(self):
+        """ Serialização compacta: cabeçalho, metadados em JSON e as colunas
+        (tamanho, valor) dos itens na ordem das caixas, com a quantidade de
+        itens e o tamanho de cada caixa (ou um tamanho só, nos metadados). Cada coluna usa o menor tipo inteiro
+        que comporta seus valores. Bem menor que o pickle dos objetos Box/Item """
+        boxes = self.list_of_boxes
+        packed = isinstance(boxes, PackedSolution)
+        if packed:
+            groups = boxes.members()
+            order = [i for b in range(len(boxes)) for i in groups[b]]
+            sizes, values = [boxes.sizes[i] for i in order], [boxes.values[i] for i in order]
+            counts, box_sizes = [len(groups[b]) for b in range(len(boxes))], [boxes.box_size] * len(boxes)
+        else:
+            boxes = boxes or []
+            sizes = [m.size for b in boxes for m in b.items]
+            values = [m.value for b in boxes for m in b.items]
+            counts, box_sizes = [len(b.items) for b in boxes], [b.total_size for b in boxes]
+        meta = {'fit_order': self.fit_order, 'sort_order': self.sort_order, 'nb_algo': self.nb_algo, \
+                'nb_order': self.nb_order, 'nb_pos': self.nb_pos, 'box_amount': self.box_amount, \
+                'profit': self.profit, 'packed': packed, 'box_size': None, \
+                'stats': self.stats.as_dict() if isinstance(self.stats, SearchStats) else None}
+        if len(set(box_sizes)) <= 1: # caixas de um tamanho só: vai nos metadados
+            meta['box_size'], box_sizes = box_sizes[0] if box_sizes else 1000, []
+        meta = json.dumps(meta, separators=(',', ':')).encode('utf-8')
+        columns = [_narrow_column(c) for c in (sizes, values, counts, box_sizes)]
+        codes = ''.join(c.typecode for c in columns).encode('ascii')
+        header = RESULT_HEADER.pack(RESULT_MAGIC, RESULT_VERSION, codes, len(meta), len(sizes), len(counts))
+        return b''.join([header, meta] + [c.tobytes() for c in columns])
+
+    @classmethod
+    def from_bytes(cls, data):
+        """ Reconstrói um Result salvo por to_bytes (com Box e Item novos, ou
+        uma PackedSolution se a original era uma) """
+        data = memoryview(data)
+        magic, version, codes, meta_len, amount, box_amount = RESULT_HEADER.unpack(data[:RESULT_HEADER.size])
+        if magic != RESULT_MAGIC or version != RESULT_VERSION:
+            raise ValueError("formato de resultado inválido ou versão não suportada")
+        pos = RESULT_HEADER.size
+        meta = json.loads(bytes(data[pos:pos + meta_len]).decode('utf-8'))
+        pos += meta_len
+        columns = []
+        meta_size = meta['box_size']
+        lengths = (amount, amount, box_amount, 0 if meta_size is not None else box_amount)
+        for code, length in zip(codes.decode('ascii'), lengths):
+            column = array(code)
+            column.frombytes(data[pos:pos + length * column.itemsize])
+            if sys.byteorder == 'big': column.byteswap()
+            pos += length * column.itemsize
+            columns.append(column)
+        sizes, values, counts, box_sizes = columns
+        if meta_size is not None: box_sizes = [meta_size] * box_amount
+        if meta['packed']:
+            boxes = PackedSolution(array('i', sizes), array('i', values), box_sizes[0] if box_amount else meta_size)
+            k = 0
+            for count in counts:
+                b = boxes.new_box()
+                for _ in range(count): boxes.add_item(k, b); k += 1
+        else:
+            boxes, k = [], 0
+            for count, size in zip(counts, box_sizes):
+                box = Box(size)
+                for i in range(k, k + count): box.add_item(Item(sizes[i], values[i]))
+                boxes.append(box); k += count
+        stats = None
+        if meta['stats'] is not None:
+            stats = SearchStats()
+            for key, v in meta['stats'].items(): setattr(stats, key, v)
+        return cls(list_of_boxes=boxes, fit_order=meta['fit_order'], sort_order=meta['sort_order'], \
+                   nb_algo=meta['nb_algo'], nb_order=meta['nb_order'], nb_pos=meta['nb_pos'], \
+                   box_amount=meta['box_amount'], profit=meta['profit'], stats=stats)
+
+
+
+class SearchStats:
+    """ SearchStats (Classe): instrumentação opcional das buscas de vizinhança.
+    Passada como stats= para nbhood/vnd/smarter_vnd, acumula os contadores e
+    os tempos gastos em cada etapa; sem ela, as buscas não medem nada """
+
+    def __init__(self):
+        self.neighbourhoods = 0 # vizinhanças geradas (chamadas do nbhood)
+        self.neighbours = 0 # vizinhos avaliados
+        self.accepted = 0 # movimentos aceitos (melhorias)
+        self.backtracks = 0 # eventos de backtracking
+        self.skipped = 0 # vizinhos descartados pelo cache ou pela lista tabu
+        self.copy_time = 0.0 # materialização das soluções (cópia das caixas)
+        self.eval_time = 0.0 # função de avaliação (lucro de cada vizinho)
+        self.sort_time = 0.0 # ordenação dos vizinhos
+
+    def as_dict(self):
+        """ Retorna as estatísticas como dicionário """
+        return dict(vars(self))
+
+    def save(self, file='stats.json'):
+        """ Exporta as estatísticas como JSON """
+        with open(file, 'w') as f: json.dump(self.as_dict(), f, indent=1)
+
+    def print_stats(self):
+        """ Imprime as estatísticas coletadas """
+        print("Vizinhanças: " + str(self.neighbourhoods) + " Vizinhos: " + str(self.neighbours) + \
+              " Aceitos: " + str(self.accepted) + " Backtracking: " + str(self.backtracks) + \
+              " Descartados: " + str(self.skipped))
+        print("Tempo: cópia %.4fs avaliação %.4fs ordenação %.4fs" % \
+              (self.copy_time, self.eval_time, self.sort_time))
+
+
+class SearchBudget:
+    """ SearchBudget (Classe): orçamento de uma busca, em tempo de relógio
+    (segundos) e/ou em número de vizinhos avaliados. None = sem limite """
+
+    def __init__(self, time_limit=None, max_evals=None):
+        self.time_limit = time_limit
+        self.max_evals = max_evals
+        self.start = perf_counter()
+        self.evals = 0
+
+    def spend(self, evals=1):
+        """ Contabiliza vizinhos avaliados """
+        self.evals += evals
+
+    def remaining_evals(self):
+        """ Quantos vizinhos ainda podem ser avaliados (None = ilimitado) """
+        return None if self.max_evals is None else max(self.max_evals - self.evals, 0)
+
+    def elapsed(self):
+        return perf_counter() - self.start
+
+    def exhausted(self):
+        """ Retorna True se o tempo ou as avaliações acabaram """
+        if self.max_evals is not None and self.evals >= self.max_evals: return True
+        return self.time_limit is not None and perf_counter() - self.start >= self.time_limit
+
+
+class SolutionCache:
+    """ SolutionCache (Classe): cache LRU de tamanho limitado com as
+    impressões digitais (fingerprint) das soluções já avaliadas e seus lucros.
+    A chave inclui a taxa, então o mesmo cache serve para várias taxas """
+
+    def __init__(self, maxsize=100000):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def seen(self, fingerprint, taxrate=10):
+        """ Retorna True (acerto) se a solução já foi avaliada """
+        key = (fingerprint, taxrate)
+        if key in self.entries:
+            self.entries.move_to_end(key); self.hits += 1
+            return True
+        self.misses += 1
+        return False
+
+    def add(self, fingerprint, profit, taxrate=10):
+        """ Registra uma solução avaliada, descartando a mais antiga se cheio """
+        self.entries[fingerprint, taxrate] = profit
+        self.entries.move_to_end((fingerprint, taxrate))
+        if len(self.entries) > self.maxsize: self.entries.popitem(last=False)
+
+    def get(self, fingerprint, taxrate=10):
+        """ Lucro guardado de uma solução, ou None """
+        return self.entries.get((fingerprint, taxrate))
+
+
+class TabuList:
+    """ TabuList (Classe): as últimas size soluções visitadas, que não podem
+    ser escolhidas de novo enquanto estiverem na lista. hits conta as
+    consultas que acharam a solução na lista """
+
+    def __init__(self, size=50):
+        self.queue = deque(maxlen=size)
+        self.members = {}
+        self.hits = 0
+
+    def add(self, fingerprint):
+        if len(self.queue) == self.queue.maxlen: # a mais antiga sai da lista
+            old = self.queue[0]
+            self.members[old] -= 1
+            if not self.members[old]: del self.members[old]
+        self.queue.append(fingerprint)
+        self.members[fingerprint] = self.members.get(fingerprint, 0) + 1
+
+    def __contains__(self, fingerprint):
+        if fingerprint in self.members:
+            self.hits += 1; return True
+        return False
+
 
 #------------------------------------------------------------------------------#
 # Arquivos                                                                     #
@@ -113,4 +462,168 @@ def load_from_file(file):
         for u in unpack:
             new_item = Item(size=u[0],value=u[1])
             packlist.append(new_item)
-        return packlist
\ No newline at end of file
+        return packlist
+
+def iter_from_file(file, chunk_size=65536):
+    """ Lê os itens de um arquivo salvo por save_to_file sem carregar a lista
+    toda na memória: o array JSON é decodificado aos poucos, um item por vez """
+    decoder = json.JSONDecoder()
+    with open(file, 'r') as f:
+        buffer, pos, started = '', 0, False
+        while True:
+            chunk = f.read(chunk_size)
+            buffer = buffer[pos:] + chunk; pos = 0
+            while True:
+                while pos < len(buffer) and buffer[pos] in ' \t\r\n,': pos += 1
+                if pos == len(buffer): break
+                if not started:
+                    if buffer[pos] != '[': raise ValueError("arquivo de instância inválido: " + str(file))
+                    started = True; pos += 1; continue
+                if buffer[pos] == ']': return
+                try:
+                    u, end = decoder.raw_decode(buffer, pos)
+                except ValueError:
+                    if not chunk: raise # o arquivo terminou no meio de um item
+                    break # item incompleto, lê mais um pedaço
+                pos = end
+                yield Item(size=u[0],value=u[1])
+            if not chunk: return
+
+
+#------------------------------------------------------------------------------#
+# Formato Binário                                                              #
+#------------------------------------------------------------------------------#
+
+""" Cabeçalho fixo de 16 bytes (assinatura, versão, quantidade de itens),
+seguido das colunas de tamanhos e de valores, em int32 little-endian """
+BINARY_MAGIC = b'APAI'
+BINARY_VERSION = 1
+BINARY_HEADER = struct.Struct('<4sIQ')
+
+
+def _column(values):
+    """ Converte uma coluna para array int32 little-endian """
+    column = array('i', values)
+    if sys.byteorder == 'big': column.byteswap()
+    return column
+
+
+""" Resultado serializado (Result.to_bytes): assinatura, versão, os tipos
+das quatro colunas, tamanho dos metadados, quantidade de itens e de caixas """
+RESULT_MAGIC = b'APRS'
+RESULT_VERSION = 1
+RESULT_HEADER = struct.Struct('<4sI4sIQQ')
+
+
+def _narrow_column(values):
+    """ Coluna inteira little-endian no menor tipo que comporta os valores """
+    low, high = (min(values), max(values)) if values else (0, 0)
+    if low >= 0 and high < 2**8: code = 'B'
+    elif low >= 0 and high < 2**16: code = 'H'
+    elif -2**31 <= low and high < 2**31: code = 'i'
+    else: code = 'q'
+    column = array(code, values)
+    if sys.byteorder == 'big': column.byteswap()
+    return column
+
+
+def _read_header(f, file=''):
+    """ Lê e valida o cabeçalho binário, retorna a quantidade de itens """
+    magic, version, amount = BINARY_HEADER.unpack(f.read(BINARY_HEADER.size))
+    if magic != BINARY_MAGIC or version != BINARY_VERSION:
+        raise ValueError("arquivo binário de instância inválido: " + str(file))
+    return amount
+
+
+def save_to_binary(pack, file='instance.bin'):
+    """ Salva uma lista de itens no formato binário """
+    sizes, values = _column(p.size for p in pack), _column(p.value for p in pack)
+    with open(file, 'wb') as f:
+        f.write(BINARY_HEADER.pack(BINARY_MAGIC, BINARY_VERSION, len(sizes)))
+        sizes.tofile(f); values.tofile(f)
+
+
+def convert_to_binary(file, binfile=None):
+    """ Converte um arquivo JSON de save_to_file para o formato binário, lendo
+    os itens um a um (iter_from_file) direto para as colunas """
+    binfile = binfile or file.rsplit('.', 1)[0] + '.bin'
+    sizes, values = array('i'), array('i')
+    for item in iter_from_file(file):
+        sizes.append(item.size); values.append(item.value)
+    if sys.byteorder == 'big': sizes.byteswap(); values.byteswap()
+    with open(binfile, 'wb') as f:
+        f.write(BINARY_HEADER.pack(BINARY_MAGIC, BINARY_VERSION, len(sizes)))
+        sizes.tofile(f); values.tofile(f)
+    return binfile
+
+
+class ItemColumns:
+    """ ItemColumns (Classe): instância binária mapeada em memória (mmap). As
+    colunas sizes e values são vistas (memoryview) sobre o arquivo, sem criar
+    um objeto Item por linha. Deve ser fechada com close() (ou usada com with) """
+
+    def __init__(self, file):
+        self._file = open(file, 'rb')
+        amount = _read_header(self._file, file)
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        start, middle = BINARY_HEADER.size, BINARY_HEADER.size + 4 * amount
+        if len(self._map) < middle + 4 * amount:
+            self.close(); raise ValueError("arquivo binário truncado: " + str(file))
+        if sys.byteorder == 'little':
+            view = memoryview(self._map)
+            self.sizes = view[start:middle].cast('i')
+            self.values = view[middle:middle + 4 * amount].cast('i')
+            view.release()
+        else: # em máquinas big-endian as colunas precisam ser convertidas
+            self.sizes = array('i', self._map[start:middle]); self.sizes.byteswap()
+            self.values = array('i', self._map[middle:middle + 4 * amount]); self.values.byteswap()
+
+    def __len__(self):
+        return len(self.sizes)
+
+    def items(self):
+        """ Gera os itens como objetos Item, sob demanda """
+        for size, value in zip(self.sizes, self.values):
+            yield Item(size=size, value=value)
+
+    def close(self):
+        """ Libera as vistas, o mapeamento e o arquivo """
+        for column in (getattr(self, 'sizes', None), getattr(self, 'values', None)):
+            if isinstance(column, memoryview): column.release()
+        self._map.close(); self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def load_from_binary(file):
+    """ Carrega uma instância binária como colunas mapeadas (ItemColumns) """
+    return ItemColumns(file)
+
+
+def iter_binary_chunks(file, chunk_size=65536, start=0, stop=None):
+    """ Leitura parcial de uma instância binária: gera (sizes, values) em
+    arrays de até chunk_size itens, no intervalo [start, stop) """
+    with open(file, 'rb') as f:
+        amount = _read_header(f, file)
+        stop = amount if stop is None else min(stop, amount)
+        pos = start
+        while pos < stop:
+            n = min(chunk_size, stop - pos)
+            sizes, values = array('i'), array('i')
+            f.seek(BINARY_HEADER.size + 4 * pos); sizes.fromfile(f, n)
+            f.seek(BINARY_HEADER.size + 4 * (amount + pos)); values.fromfile(f, n)
+            if sys.byteorder == 'big': sizes.byteswap(); values.byteswap()
+            yield sizes, values
+            pos += n
+
+
+def load_items(file):
+    """ Carrega uma instância em qualquer um dos formatos (JSON ou binário),
+    detectando o formato pela assinatura do arquivo """
+    with open(file, 'rb') as f: binary = f.read(len(BINARY_MAGIC)) == BINARY_MAGIC
+    if not binary: return load_from_file(file)
+    with load_from_binary(file) as columns: return list(columns.items())
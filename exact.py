@@ -0,0 +1,210 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" exact.py - solução exata (branch and bound) para instâncias pequenas e
+limitantes de qualidade para as heurísticas nas maiores """
+
+import sys, argparse
+from time import perf_counter
+from data import Box, Result, PackedSolution, box_profit, load_from_file
+from heuristic import fit, vnd, calc_profit
+from bounds import compute_bounds
+
+
+#------------------------------------------------------------------------------#
+#   Relatório                                                                  #
+# -----------------------------------------------------------------------------#
+
+
+class BoundReport:
+    """ BoundReport (Classe): qualidade da solução do branch and bound.
+    lower é o lucro da melhor solução achada, upper um limitante superior do
+    lucro ótimo; se a busca terminou, as duas coincidem (optimal=True) """
+
+    def __init__(self, lower, upper, optimal, nodes=0, pruned=0, memo_hits=0, elapsed=0.0, \
+                 warm_start=None):
+        self.lower = lower
+        self.upper = upper
+        self.optimal = optimal
+        self.nodes = nodes # nós visitados
+        self.pruned = pruned # nós podados pelo limitante
+        self.memo_hits = memo_hits # nós podados por estado já visitado
+        self.elapsed = elapsed
+        self.warm_start = warm_start # lucro da solução heurística inicial
+
+    @property
+    def gap(self):
+        """ Distância relativa entre o limitante e a melhor solução """
+        if self.upper == self.lower: return 0.0
+        return (self.upper - self.lower) / abs(self.upper) if self.upper else float('inf')
+
+    def print_report(self):
+        """ Imprime o resumo da busca """
+        print(("Ótimo: " if self.optimal else "Melhor: ") + str(self.lower) + \
+              " Limitante: " + str(self.upper) + " Gap: " + "%.4f%%" % (100 * self.gap))
+        print("Nós: " + str(self.nodes) + " Podados: " + str(self.pruned) + \
+              " Memorizados: " + str(self.memo_hits) + " Tempo: " + "%.3fs" % self.elapsed)
+        if self.warm_start is not None: print("Solução inicial: " + str(self.warm_start))
+
+
+#------------------------------------------------------------------------------#
+#   Branch and Bound                                                           #
+# -----------------------------------------------------------------------------#
+
+
+EPS = 1e-9 # folga para os arredondamentos de ponto flutuante nos int()
+
+
+def heuristic_start(items, taxrate=10, min_tax=50, box_size=1000, profit_of=None):
+    """ Solução inicial para o branch and bound: as 16 combinações do fit com
+    o tamanho de caixa e o min_tax do problema, seguidas do vnd na melhor.
+    profit_of(usado, valor) é a função objetivo usada para compará-las """
+    profit_of = profit_of or (lambda u, v: box_profit(u, v, tax_rate=taxrate, min_tax=min_tax))
+    score = lambda boxes: sum(profit_of(b.used_size, b.total_value) for b in boxes)
+    best = None
+    for f in ['first','best','worst','avoidtaxes']:
+        for s in [True, False, 'cheapest', 'expensive']:
+            boxes = fit(items, fit=f, sortedlist=s, box_size=box_size, min_tax=min_tax)
+            if best is None or score(boxes) > score(best.list_of_boxes):
+                best = Result(list_of_boxes=boxes, fit_order=f, sort_order=s, box_amount=len(boxes), \
+                              profit=calc_profit(boxes, taxrate, min_tax))
+    improved = vnd(best, taxrate=taxrate)
+    return improved if score(improved.list_of_boxes) > score(best.list_of_boxes) else best
+
+
+def solve(items, taxrate=10, min_tax=50, base_box_cost=5, box_rate=0.005, box_size=1000, \
+          time_limit=10, warm_start=None, max_states=1000000, verbose=False):
+    """ Branch and bound sobre a mesma função objetivo de Box.profit_per_box.
+    Como o valor total dos itens é fixo, maximizar o lucro é minimizar a soma
+    dos custos das caixas mais as taxas. Os itens entram do maior para o menor;
+    cada um vai para uma caixa aberta ou para uma caixa nova.
+    Podas:
+        limitante - o custo de uma caixa só cresce ao receber itens, e o custo
+                    (como o int() é superaditivo) cresce pelo menos o custo
+                    isolado do item: int(box_rate * tamanho), mais a taxa do
+                    item se ele sozinho passar do min_tax. As caixas novas
+                    ainda necessárias custam cada uma pelo menos int(base_box_cost)
+        simetria - as caixas são iguais: caixas abertas com os mesmos totais
+                   são tentadas uma vez só, e caixas novas só no fim da lista
+        memória - estados (item, totais das caixas ainda úteis) já visitados
+                  com custo menor ou igual não são expandidos de novo
+    Parametros:
+        time_limit: segundos; ao estourar, retorna a melhor solução e o gap
+        warm_start: Result inicial (limitante inferior), com lista de caixas ou
+                    PackedSolution. None = heuristic_start
+        max_states: tamanho máximo da tabela de estados memorizados
+    Retorna (Result, BoundReport) """
+    start = perf_counter()
+    items = sorted(items, key=lambda i: (i.size, i.value), reverse=True)
+    n = len(items)
+    total_value = sum(i.value for i in items)
+
+    def profit_of(used, value):
+        return box_profit(used, value, base_box_cost, box_rate, taxrate, min_tax)
+
+    def cost_of(used, value):
+        return value - profit_of(used, value)
+
+    if any(i.size > box_size for i in items): raise ValueError("item maior que a caixa")
+
+    # limitantes de cada sufixo da lista: tamanho, custo mínimo e menor item
+    item_floor = [int(box_rate * i.size - EPS) + (int((i.value / 100) * taxrate - EPS) if i.value > min_tax else 0) \
+                  for i in items]
+    rest_size, rest_floor, rest_min = [0] * (n + 1), [0] * (n + 1), [box_size + 1] * (n + 1)
+    for k in range(n - 1, -1, -1):
+        rest_size[k] = rest_size[k+1] + items[k].size
+        rest_floor[k] = rest_floor[k+1] + item_floor[k]
+        rest_min[k] = min(rest_min[k+1], items[k].size)
+    new_box_cost = max(int(base_box_cost - EPS), 0)
+
+    # solução inicial: limitante inferior do lucro (superior do custo)
+    if warm_start is None: warm_start = heuristic_start(items, taxrate, min_tax, box_size, profit_of)
+    warm_boxes = warm_start.list_of_boxes if warm_start else []
+    if isinstance(warm_boxes, PackedSolution): warm_boxes = warm_boxes.to_boxes()
+    warm_boxes = [b for b in warm_boxes if b.items]
+    if any(b.used_size > box_size for b in warm_boxes): raise ValueError("solução inicial não cabe nas caixas")
+    warm_profit = sum(profit_of(b.used_size, b.total_value) for b in warm_boxes) if warm_boxes else None
+    best_cost = total_value - warm_profit if warm_profit is not None else float('inf')
+    best_assign = None
+    # limitante global (bounds.py): se a solução inicial chegar nele, já é ótima
+    profit_upper = compute_bounds(items, taxrate, min_tax, base_box_cost, box_rate, box_size).profit_upper
+
+    used, value = [], [] # totais das caixas abertas
+    assign = [0] * n
+    memo = {}
+    counters = {'nodes': 0, 'pruned': 0, 'memo': 0}
+    deadline = None if time_limit is None else start + time_limit
+    timed_out = False
+
+    def bound(k, cost):
+        """ Limitante inferior do custo final a partir do item k """
+        room = sum(box_size - u for u in used if box_size - u >= rest_min[k]) if k < n else 0
+        missing = rest_size[k] - room
+        new_boxes = -(-missing // box_size) if missing > 0 else 0
+        return cost + rest_floor[k] + new_boxes * new_box_cost
+
+    def search(k, cost):
+        nonlocal best_cost, best_assign, timed_out
+        counters['nodes'] += 1
+        if deadline is not None and not counters['nodes'] & 1023 and perf_counter() > deadline:
+            timed_out = True
+        if timed_out: return
+        if k == n:
+            if cost < best_cost: best_cost, best_assign = cost, list(assign)
+            return
+        if bound(k, cost) >= best_cost: counters['pruned'] += 1; return
+        useful = tuple(sorted((u, v) for u, v in zip(used, value) if box_size - u >= rest_min[k]))
+        state = (k, useful)
+        seen = memo.get(state)
+        if seen is not None and seen <= cost: counters['memo'] += 1; return
+        if len(memo) >= max_states: memo.clear()
+        memo[state] = cost
+
+        item = items[k]
+        tried = set()
+        moves = [] # (aumento de custo, caixa); -1 é uma caixa nova
+        for b, (u, v) in enumerate(zip(used, value)):
+            if u + item.size > box_size or (u, v) in tried: continue
+            tried.add((u, v))
+            moves.append((cost_of(u + item.size, v + item.value) - cost_of(u, v), b))
+        moves.append((cost_of(item.size, item.value), -1))
+        moves.sort() # as opções mais baratas primeiro acham boas soluções antes
+
+        for delta, b in moves:
+            assign[k] = b if b >= 0 else len(used)
+            if b < 0:
+                used.append(item.size); value.append(item.value)
+                search(k + 1, cost + delta)
+                used.pop(); value.pop()
+            else:
+                used[b] += item.size; value[b] += item.value
+                search(k + 1, cost + delta)
+                used[b] -= item.size; value[b] -= item.value
+            if timed_out: return
+
+    root_bound = bound(0, 0)
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 4 * n + 100))
+    if total_value - best_cost < min(profit_upper, total_value - root_bound): search(0, 0)
+
+    if best_assign is not None:
+        boxes = [Box(box_size) for _ in range(max(best_assign) + 1)] if best_assign else []
+        for item, b in zip(items, best_assign): boxes[b].add_item(item)
+    else: boxes = warm_boxes
+    profit = total_value - best_cost if boxes else 0
+    optimal = not timed_out
+    upper = profit if optimal else min(profit_upper, total_value - root_bound)
+    report = BoundReport(profit, upper, optimal, counters['nodes'], counters['pruned'], \
+                         counters['memo'], perf_counter() - start, warm_profit)
+    result = Result(list_of_boxes=boxes, fit_order='exact', sort_order='optimal' if optimal else 'bounded', \
+                    profit=profit, box_amount=len(boxes))
+    if verbose: result.print_result_h(); report.print_report()
+    return result, report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Solução exata por branch and bound')
+    parser.add_argument('file')
+    parser.add_argument('--taxrate', type=int, default=10)
+    parser.add_argument('--time-limit', type=float, default=10)
+    args = parser.parse_args()
+    solve(load_from_file(args.file), taxrate=args.taxrate, time_limit=args.time_limit, verbose=True)
@@ -0,0 +1,318 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" fitindex.py - estruturas de índice para as heurísticas de construção """
+
+from bisect import bisect_left, bisect_right, insort
+from heapq import heappush, heappop
+
+
+#------------------------------------------------------------------------------#
+#   Estruturas de Índice                                                       #
+# -----------------------------------------------------------------------------#
+
+
+class FirstFitTree:
+    """ FirstFitTree (Classe): árvore de segmentos com o maior espaço livre de
+    cada intervalo de caixas, na ordem de criação. Permite achar a primeira
+    caixa onde um item cabe em O(log n) """
+
+    def __init__(self, capacity):
+        self.leaves = 1
+        while self.leaves < max(capacity, 1): self.leaves *= 2
+        self.tree = [-1] * (2 * self.leaves) # -1: folha sem caixa
+        self.amount = 0
+
+    def add_box(self, room):
+        """ Cria uma nova caixa com o espaço livre informado, retorna seu id """
+        box = self.amount
+        self.amount += 1
+        self.update(box, room)
+        return box
+
+    def fill(self, rooms):
+        """ Preenche as primeiras folhas com o espaço livre de cada caixa e
+        monta a árvore de uma vez, em O(n) em vez de n atualizações """
+        tree = self.tree
+        tree[self.leaves:self.leaves + len(rooms)] = rooms
+        for pos in range(self.leaves - 1, 0, -1):
+            left, right = tree[2*pos], tree[2*pos+1]
+            tree[pos] = left if left >= right else right
+        self.amount = len(rooms)
+
+    def update(self, box, room):
+        """ Atualiza o espaço livre de uma caixa e recalcula os seus ancestrais """
+        pos = box + self.leaves
+        self.tree[pos] = room
+        pos //= 2
+        while pos:
+            left, right = self.tree[2*pos], self.tree[2*pos+1]
+            self.tree[pos] = left if left >= right else right
+            pos //= 2
+
+    def find(self, size):
+        """ Retorna a primeira caixa com espaço livre >= size, ou -1 """
+        tree = self.tree
+        if tree[1] < size: return -1
+        pos = 1
+        while pos < self.leaves: # desce sempre pelo filho mais à esquerda que couber
+            pos *= 2
+            if tree[pos] < size: pos += 1
+        return pos - self.leaves
+
+
+class NoTaxFitTree:
+    """ NoTaxFitTree (Classe): árvore de segmentos com duas folgas por caixa
+    (espaço e valor até o mínimo taxável), usada no first fit do avoidtaxes.
+    A descida poda os ramos onde um dos máximos não basta """
+
+    def __init__(self, capacity):
+        self.leaves = 1
+        while self.leaves < max(capacity, 1): self.leaves *= 2
+        self.room = [-1] * (2 * self.leaves)
+        self.value = [-1] * (2 * self.leaves)
+        self.amount = 0
+
+    def add_box(self, room, value_room):
+        """ Cria uma nova caixa com as folgas informadas, retorna seu id """
+        box = self.amount
+        self.amount += 1
+        self.update(box, room, value_room)
+        return box
+
+    def fill(self, rooms, value_rooms):
+        """ Preenche as primeiras folhas com as folgas de cada caixa e monta a
+        árvore de uma vez, em O(n) """
+        room, val = self.room, self.value
+        room[self.leaves:self.leaves + len(rooms)] = rooms
+        val[self.leaves:self.leaves + len(value_rooms)] = value_rooms
+        for pos in range(self.leaves - 1, 0, -1):
+            left, right = room[2*pos], room[2*pos+1]
+            room[pos] = left if left >= right else right
+            left, right = val[2*pos], val[2*pos+1]
+            val[pos] = left if left >= right else right
+        self.amount = len(rooms)
+
+    def update(self, box, room, value_room):
+        """ Atualiza as folgas de uma caixa (-1 desativa a caixa) """
+        pos = box + self.leaves
+        self.room[pos], self.value[pos] = room, value_room
+        pos //= 2
+        while pos:
+            self.room[pos] = max(self.room[2*pos], self.room[2*pos+1])
+            self.value[pos] = max(self.value[2*pos], self.value[2*pos+1])
+            pos //= 2
+
+    def find(self, size, value):
+        """ Retorna a primeira caixa que comporta o tamanho e o valor, ou -1 """
+        room, val = self.room, self.value
+        stack = [1]
+        while stack:
+            pos = stack.pop()
+            if room[pos] < size or val[pos] < value: continue
+            if pos >= self.leaves: return pos - self.leaves
+            stack.append(2*pos+1) # o filho da esquerda é visitado primeiro
+            stack.append(2*pos)
+        return -1
+
+
+class BestFitIndex:
+    """ BestFitIndex (Classe): lista ordenada de (usado, desempate, caixa).
+    O desempate reproduz a ordenação estável feita pelo best fit original:
+    caixas alteradas ou novas vão para o fim do seu grupo de mesmo tamanho """
+
+    def __init__(self, box_size):
+        self.box_size = box_size
+        self.keys = []
+        self.seq = 0
+
+    def find(self, size):
+        """ Retorna a posição da caixa mais cheia onde o item cabe, ou -1 """
+        keys = self.keys
+        pos = bisect_right(keys, (self.box_size - size, float('inf')))
+        if not pos: return -1
+        return bisect_left(keys, (keys[pos-1][0],)) # primeira com esse tamanho
+
+    def add(self, pos, size):
+        """ Adiciona size à caixa da posição pos, retorna o id da caixa """
+        used, _, box = self.keys.pop(pos)
+        self.seq += 1
+        insort(self.keys, (used + size, self.seq, box))
+        return box
+
+    def new_box(self, box, size):
+        """ Insere uma nova caixa com o tamanho usado informado """
+        self.seq += 1
+        insort(self.keys, (size, self.seq, box))
+
+    def order(self):
+        """ Ids das caixas na ordem em que o best fit original as deixa """
+        return [k[2] for k in sorted(self.keys, key=lambda k: (-k[0], k[1]))]
+
+
+class WorstFitHeap:
+    """ WorstFitHeap (Classe): heap de (usado, desempate, caixa). A caixa
+    alterada vai para o início do seu grupo de mesmo tamanho, e as novas
+    para o fim, como na ordenação estável do worst fit original """
+
+    def __init__(self, box_size):
+        self.box_size = box_size
+        self.heap = []
+        self.seq = 0
+
+    def fit(self, size):
+        """ Coloca size na caixa mais vazia, se couber. Retorna o id, ou -1 """
+        if not self.heap: return -1
+        used, tie, box = self.heap[0]
+        if used + size > self.box_size: return -1
+        heappop(self.heap)
+        self.seq += 1
+        heappush(self.heap, (used + size, -self.seq, box))
+        return box
+
+    def new_box(self, box, size):
+        """ Insere uma nova caixa com o tamanho usado informado """
+        self.seq += 1
+        heappush(self.heap, (size, self.seq, box))
+
+    def order(self):
+        """ Ids das caixas na ordem em que o worst fit original as deixa """
+        return [k[2] for k in sorted(self.heap)]
+
+
+class MergeTree:
+    """ MergeTree (Classe): árvore de segmentos com o menor espaço usado de
+    cada intervalo de caixas, usada no repack. Caixas absorvidas viram
+    lápides (infinito) em vez de saírem da lista, então as posições não
+    mudam e podem ser restauradas depois. Acha a primeira ou a última caixa
+    com espaço usado <= limite em O(log n) """
+
+    def __init__(self, values):
+        self.leaves = 1
+        while self.leaves < max(len(values), 1): self.leaves *= 2
+        tree = self.tree = [float('inf')] * (2 * self.leaves)
+        tree[self.leaves:self.leaves + len(values)] = values
+        for pos in range(self.leaves - 1, 0, -1):
+            left, right = tree[2*pos], tree[2*pos+1]
+            tree[pos] = left if left <= right else right
+
+    def update(self, leaf, value):
+        """ Muda o valor de uma folha e recalcula os seus ancestrais """
+        tree = self.tree
+        pos = leaf + self.leaves
+        tree[pos] = value
+        pos //= 2
+        while pos:
+            left, right = tree[2*pos], tree[2*pos+1]
+            tree[pos] = left if left <= right else right
+            pos //= 2
+
+    def remove(self, leaf):
+        """ Põe uma lápide na folha, retorna o valor que ela tinha """
+        value = self.tree[leaf + self.leaves]
+        self.update(leaf, float('inf'))
+        return value
+
+    def first_leq(self, limit):
+        """ Primeira folha com valor <= limit, ou -1 """
+        tree = self.tree
+        if tree[1] > limit: return -1
+        pos = 1
+        while pos < self.leaves:
+            pos *= 2
+            if tree[pos] > limit: pos += 1
+        return pos - self.leaves
+
+    def last_leq(self, limit):
+        """ Última folha com valor <= limit, ou -1 """
+        tree = self.tree
+        if tree[1] > limit: return -1
+        pos = 1
+        while pos < self.leaves:
+            pos = 2*pos + 1
+            if tree[pos] > limit: pos -= 1
+        return pos - self.leaves
+
+
+#------------------------------------------------------------------------------#
+#   Motor de Alocação                                                          #
+# -----------------------------------------------------------------------------#
+
+
+def first_fit(items, box_size=1000):
+    """ First Fit indexado: retorna (alocação, ordem), onde alocação[k] é o id
+    da caixa do k-ésimo item e ordem é a lista final dos ids das caixas """
+    tree = FirstFitTree(len(items))
+    used, assign = [], []
+    for item in items:
+        box = tree.find(item.size)
+        if box < 0:
+            box = tree.add_box(box_size - item.size)
+            used.append(item.size)
+        else:
+            used[box] += item.size
+            tree.update(box, box_size - used[box])
+        assign.append(box)
+    return assign, list(range(len(used)))
+
+
+def best_fit(items, box_size=1000):
+    """ Best Fit indexado: mesma saída de first_fit """
+    index = BestFitIndex(box_size)
+    assign, order, amount = [], [], 0
+    last = len(items) - 1
+    for k, item in enumerate(items):
+        # a ordem final é a ordenação feita antes do último item
+        if k == last: order = index.order()
+        pos = index.find(item.size)
+        if pos < 0:
+            box = amount; amount += 1
+            index.new_box(box, item.size)
+            if k == last: order.append(box)
+        else:
+            box = index.add(pos, item.size)
+        assign.append(box)
+    return assign, order
+
+
+def worst_fit(items, box_size=1000):
+    """ Worst Fit indexado: mesma saída de first_fit """
+    heap = WorstFitHeap(box_size)
+    assign, order, amount = [], [], 0
+    last = len(items) - 1
+    for k, item in enumerate(items):
+        if k == last: order = heap.order()
+        box = heap.fit(item.size)
+        if box < 0:
+            box = amount; amount += 1
+            heap.new_box(box, item.size)
+            if k == last: order.append(box)
+        assign.append(box)
+    return assign, order
+
+
+def avoidtaxes_fit(items, box_size=1000, min_tax=50):
+    """ Avoidtaxes indexado: baratos em caixas não taxadas (first fit com duas
+    folgas), caros em first fit comum. Mesma saída de first_fit, com a
+    alocação alinhada à ordem de entrada dos itens """
+    cheap_tree = NoTaxFitTree(len(items))
+    used, value = [], []
+    assign = [0] * len(items)
+    expensive = []
+    for k, item in enumerate(items):
+        if item.value > min_tax: expensive.append(k); continue
+        box = cheap_tree.find(item.size, item.value)
+        if box < 0:
+            box = cheap_tree.add_box(0, 0)
+            used.append(0); value.append(0)
+        used[box] += item.size; value[box] += item.value
+        # a caixa só continua aberta enquanto o usado não passar do mínimo taxável
+        if used[box] <= min_tax:
+            cheap_tree.update(box, box_size - used[box], min_tax - value[box])
+        else:
+            cheap_tree.update(box, -1, -1)
+        assign[k] = box
+    cheap_amount = len(used)
+    exp_assign, exp_order = first_fit([items[k] for k in expensive], box_size)
+    for k, box in zip(expensive, exp_assign): assign[k] = cheap_amount + box
+    return assign, list(range(cheap_amount + len(exp_order)))
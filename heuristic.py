@@ -3,9 +3,16 @@
 
 """ heuristics.py - heurísticas e etc """
 
-import sys, random, copy
+import sys, random
+from array import array
 from operator import itemgetter, attrgetter
-from data import Item, Box, load_from_file, Result
+from collections import Counter
+from heapq import heappush, heapreplace
+from bisect import bisect_left, insort
+from time import perf_counter, time
+from data import Item, Box, load_from_file, Result, box_profit, PackedSolution, SearchStats, SearchBudget
+from fitindex import first_fit, best_fit, worst_fit, avoidtaxes_fit, MergeTree, FirstFitTree, NoTaxFitTree
+from bounds import compute_bounds, solution_bounds
 
 #------------------------------------------------------------------------------#
 #   Funções Auxiliares                                                         #
@@ -19,19 +26,156 @@ def print_boxes(boxes):
 
 def calc_profit(boxes, tax=10, min_t=50):
     """ Função de Avalição: Calcula o lucro de uma lista de caixas """
+    if isinstance(boxes, PackedSolution): return boxes.profit(tax_rate=tax, min_tax=min_t)
     temp = []
     for b in boxes:
         temp.append(b.profit_per_box(tax_rate=tax,min_tax=min_t))
     return sum(temp)
 
 
+FP_MASK = (1 << 64) - 1
+
+
+def _mix(x):
+    """ Embaralha um inteiro de 64 bits (finalizador do splitmix64) """
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & FP_MASK
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & FP_MASK
+    return x ^ (x >> 31)
+
+
+def item_hash(size, value):
+    """ Hash de um item: itens de mesmo tamanho e valor são equivalentes """
+    return _mix(hash((size, value)) & FP_MASK)
+
+
+def box_hash(item_sum):
+    """ Hash de uma caixa a partir da soma dos hashes de seus itens (a soma
+    não depende da ordem dos itens; caixas vazias também têm hash) """
+    return _mix((item_sum + 0x9E3779B97F4A7C15) & FP_MASK)
+
+
+def fingerprint(boxes):
+    """ Impressão digital de uma solução: soma dos hashes das caixas, que não
+    depende da ordem das caixas nem da ordem dos itens em cada caixa """
+    if isinstance(boxes, PackedSolution):
+        sums = [0] * len(boxes)
+        for i, b in enumerate(boxes.assign):
+            if b >= 0: sums[b] += item_hash(boxes.sizes[i], boxes.values[i])
+    else:
+        sums = [sum(item_hash(m.size, m.value) for m in b.items) for b in boxes]
+    return sum(box_hash(h) for h in sums) & FP_MASK
+
+
+def box_totals(boxes):
+    """ Retorna as colunas (espaço usado, valor total) das caixas de uma
+    solução, seja ela uma lista de Box ou uma PackedSolution """
+    if isinstance(boxes, PackedSolution): return boxes.used, boxes.value
+    return [b.used_size for b in boxes], [b.total_value for b in boxes]
+
+
+def profit_sweep(boxes, tax_rates=(10,), min_taxes=(50,), base_box_costs=(5,), box_rates=(0.005,)):
+    """ Avalia uma solução para todas as combinações de parâmetros de uma vez.
+    O lucro de cada caixa é valor - int(taxa) - int(custo), então a soma se
+    separa em três partes: o valor total (fixo), o custo das caixas (só
+    depende de base_box_cost/box_rate e do espaço usado) e a taxação (só
+    depende de tax_rate/min_tax e do valor). Cada parte é calculada sobre
+    os valores distintos das caixas, com as mesmas contas de profit_per_box.
+    Retorna um dicionário (tax_rate, min_tax, base_box_cost, box_rate) -> lucro """
+    used, value = box_totals(boxes)
+    total_value = sum(value)
+    used_count = Counter(used)
+    value_count = sorted(Counter(value).items()) # (valor, quantidade) em ordem crescente
+    costs = {}
+    for base in base_box_costs:
+        for rate in box_rates:
+            costs[base, rate] = sum(c * int(base + (rate * u)) for u, c in used_count.items())
+    taxes = {}
+    for m in min_taxes:
+        taxed = [(v, c) for v, c in value_count if v > m] # caixas acima do mínimo taxável
+        for t in tax_rates:
+            taxes[t, m] = sum(c * int((v / 100) * t) for v, c in taxed)
+    grid = {}
+    for t in tax_rates:
+        for m in min_taxes:
+            for base in base_box_costs:
+                for rate in box_rates:
+                    grid[t, m, base, rate] = total_value - taxes[t, m] - costs[base, rate]
+    return grid
+
+
+def calc_profit_batch(solutions, tax=10, min_t=50):
+    """ Função de Avaliação em lote: lucro de cada solução da lista """
+    return [profit_sweep(s, (tax,), (min_t,))[tax, min_t, 5, 0.005] for s in solutions]
+
+
 #------------------------------------------------------------------------------#
 #   Heurística de Construção                                                   #
 # -----------------------------------------------------------------------------#
 
 
-def fit(items, fit='first', sortedlist=False, box_size=1000, verbose=False, min_tax=50):
+def fit(items, fit='first', sortedlist=False, box_size=1000, verbose=False, min_tax=50, packed=False):
     """ Heuristicas para Construção de Soluções \n
+    Mesmas opções e mesmo resultado de fit_linear, mas a escolha da caixa é
+    feita por índices (fitindex.py) em vez de varrer/reordenar todas as caixas:
+        'first' - árvore de segmentos com o espaço livre de cada caixa, O(log n)
+        'best' - lista ordenada por espaço usado, busca binária
+        'worst' - heap pelo espaço usado
+        'avoidtaxes' - árvore de segmentos com as folgas de espaço e de valor
+    Com packed=True retorna uma PackedSolution em vez de uma lista de Box
+     """
+    items, assign, order = fit_vectors(items, fit, sortedlist, box_size, min_tax)
+    boxes = boxes_from_vectors(items, assign, order, box_size, packed)
+
+    if verbose: #se verboso, imprime o resultado
+        print(str(fit) + " fit: " + str(sortedlist) + ' ' + str(len(boxes)))
+        totals = zip(boxes.used, boxes.value) if packed else ((b.used_size, b.total_value) for b in boxes)
+        for u, v in totals: print(str(u) + '-' + str(v),end='|')
+        print()
+
+    return boxes #retorna a lista final das caixas
+
+
+def sort_items(items, sortedlist=False):
+    """ Ordenação dos itens usada pelo fit """
+    if sortedlist: items = sorted(items,key=attrgetter('size'), reverse=True)
+    if sortedlist == 'cheapest': items = sorted(items,key=attrgetter('value'))
+    if sortedlist == 'expensive': items = sorted(items,key=attrgetter('value'), reverse=True)
+    return items
+
+
+def fit_vectors(items, fit='first', sortedlist=False, box_size=1000, min_tax=50):
+    """ O fit sem montar as caixas: retorna (itens na ordem usada, alocação,
+    ordem), onde alocação[k] é o id da caixa do k-ésimo item e ordem é a lista
+    final dos ids das caixas """
+    items = sort_items(items, sortedlist)
+    assign, order = [], []
+    if fit == 'first': assign, order = first_fit(items, box_size)
+    elif fit == 'best': assign, order = best_fit(items, box_size)
+    elif fit == 'worst': assign, order = worst_fit(items, box_size)
+    elif fit in ("avoidtaxes"): assign, order = avoidtaxes_fit(items, box_size, min_tax)
+    return items, assign, order
+
+
+def boxes_from_vectors(items, assign, order, box_size=1000, packed=False):
+    """ Monta as caixas (lista de Box ou PackedSolution) da saída de fit_vectors """
+    if packed: return PackedSolution.from_assignment(items, assign, order, box_size)
+    created = [Box(box_size) for _ in order] # uma caixa para cada id alocado
+    for item, b in zip(items, assign): created[b].add_item(item)
+    return [created[b] for b in order] # e as coloca na ordem final
+
+
+def vectors_profit(items, assign, amount, tax=10, min_t=50):
+    """ Lucro de uma alocação (saída de fit_vectors) sem montar as caixas """
+    used, value = [0] * amount, [0] * amount
+    for item, b in zip(items, assign):
+        used[b] += item.size
+        value[b] += item.value
+    return sum(box_profit(u, v, tax_rate=tax, min_tax=min_t) for u, v in zip(used, value))
+
+
+def fit_linear(items, fit='first', sortedlist=False, box_size=1000, verbose=False, min_tax=50):
+    """ Versão original (varredura linear) das Heuristicas para Construção de
+    Soluções, mantida como referência para o benchmark do fit indexado \n
     Ordenação de Caixa:
         False = ordem de chegada
         True = ordenado do maior para o menor
@@ -100,16 +244,111 @@ def fit(items, fit='first', sortedlist=False, box_size=1000, verbose=False, min_
     return boxes #retorna a lista final das caixas
 
 
+def choose_box(boxes, item, fit='first', min_tax=50):
+    """ Escolhe a caixa existente onde o item entra, pela mesma política do fit.
+    É a regra usada pelo fit_stream e pelo repair do alns; BoxIndex.choose
+    faz a mesma escolha pelas árvores, em O(log n):
+        'first' - a primeira onde couber
+        'best' - a mais cheia onde couber
+        'worst' - a mais vazia onde couber
+        'avoidtaxes' - itens baratos vão para uma caixa que continue sem taxa;
+                       itens caros, para uma caixa já taxada (first fit)
+    Empates ficam com a primeira caixa da lista. Retorna a posição da caixa,
+    ou -1 se for preciso abrir uma nova """
+    chosen, chosen_used = -1, None
+    for k, b in enumerate(boxes):
+        if b is None or not b.can_add(item): continue
+        if fit == 'avoidtaxes':
+            if item.value <= min_tax:
+                if b.can_add_without_tax(item, min_tax) and b.used_size <= min_tax: return k
+            elif b.total_value > min_tax: return k
+            continue
+        if fit == 'best':
+            if chosen_used is None or b.used_size > chosen_used: chosen, chosen_used = k, b.used_size
+        elif fit == 'worst':
+            if chosen_used is None or b.used_size < chosen_used: chosen, chosen_used = k, b.used_size
+        else: return k
+    return chosen
+
+
+def fit_stream(items, fit='first', box_size=1000, min_tax=50, max_open=64, close_room=0, \
+               close='oldest'):
+    """ Empacotamento online: consome um iterador de itens (ex: iter_from_file)
+    e gera as caixas à medida que são fechadas, mantendo apenas as caixas
+    abertas na memória (no máximo max_open por grupo). \n
+    Heurísticas: as mesmas de fit ('first', 'best', 'worst', 'avoidtaxes'),
+    aplicadas apenas às caixas abertas. A ordenação prévia não existe no modo
+    online, pois exigiria a lista inteira.
+    Fechamento de caixas:
+        close_room - a caixa fecha quando o espaço livre for <= close_room (cheia)
+        max_open - limite de caixas abertas; ao passar dele, uma caixa é fechada
+                   (None = sem limite)
+        close - qual caixa fechar ao passar do limite: 'oldest' (a mais antiga,
+                como no next-k fit) ou 'fullest' (a com menos espaço livre)
+    No avoidtaxes, uma caixa barata também fecha quando não pode mais receber
+    itens sem ser taxada. No fim do iterador, as caixas abertas são emitidas """
+    cheap_boxes, open_boxes = [], [] # caixas abertas de cada grupo, em ordem de abertura
+
+    def closes(b, cheap):
+        if b.total_size - b.used_size <= close_room: return True
+        return cheap and (b.used_size > min_tax or b.total_value >= min_tax)
+
+    for item in items:
+        cheap = fit == 'avoidtaxes' and item.value <= min_tax
+        boxes = cheap_boxes if cheap else open_boxes
+        k = choose_box(boxes, item, fit, min_tax) # as caras só convivem com caras, que já são taxadas
+        b = boxes[k] if k >= 0 else None
+        if b is None:
+            if max_open is not None and len(boxes) >= max_open: # abre espaço fechando uma caixa
+                victim = boxes[0] if close == 'oldest' else \
+                         max(boxes, key=attrgetter('used_size'))
+                boxes.remove(victim)
+                yield victim
+            b = Box(box_size)
+            boxes.append(b)
+        b.add_item(item)
+        if closes(b, cheap):
+            boxes.remove(b)
+            yield b
+
+    for b in cheap_boxes + open_boxes: yield b # fim da entrada: fecha o que sobrou
+
+
 #------------------------------------------------------------------------------#
 #   Busca de Heurística Ótima                                                  #
 # -----------------------------------------------------------------------------#
 
 
-def multifit(file=None,taxrate=10,verbose=False):
+_pool_items = None # lista de itens de cada processo do multifit paralelo
+
+
+def _init_pool(items):
+    """ Inicializador dos processos: recebe a lista de itens uma única vez """
+    global _pool_items
+    _pool_items = items
+
+
+def _fit_task(args):
+    """ Executa uma combinação fit x ordenação num processo do pool. Só o lucro
+    e os vetores (alocação, ordem) voltam ao processo principal, em array:
+    desserializar as caixas de cada combinação custaria quase o próprio fit """
+    f, s, taxrate = args
+    items, assign, order = fit_vectors(_pool_items, fit=f, sortedlist=s)
+    return vectors_profit(items, assign, len(order), taxrate), array('i', assign), array('i', order)
+
+
+def multifit(file=None,taxrate=10,verbose=False,workers=1,items=None,packed=False,gap=None):
     """ Executa todas Heurísticas com a lista de objetos definidos, utilizando o
     valor da taxa definida, e retorna o melhor variante do algorítimo
+    Parametros:
+        workers: número de processos (1 = execução serial, None = todos os núcleos).
+                 As 16 combinações são independentes e o resultado é o mesmo da serial
+        items: lista de itens já carregada (usada no lugar de file)
+        packed: usa PackedSolution como representação das soluções
+        gap: na execução serial, para assim que uma combinação ficar a no
+             máximo gap (fração) do limitante superior do lucro (bounds.py)
     """
-    my_items = load_from_file(file)
+    my_items = items if items is not None else load_from_file(file)
 
     if verbose: #imprime alguns detalhes, caso verboso
         totalitemvalue,totalitemsize = 0,0
@@ -118,16 +357,34 @@ def multifit(file=None,taxrate=10,verbose=False):
 
     fit_option = ['first','best','worst','avoidtaxes'] #todas as opções de heuristicas do fit
     sort_option = [True, False, 'cheapest', 'expensive'] #todas as opções de ordenação do fit
+    combos = [(f, s) for f in fit_option for s in sort_option]
 
-    results = [] #lista dos resultados
-
+    if workers == 1:
+        bounds = compute_bounds(my_items, taxrate) if gap is not None else None
+        packs = [] #lista das caixas e lucros de cada combinação
+        for f, s in combos:
+            mybox = fit(my_items,fit=f,sortedlist=s,verbose=False,packed=packed) #executa a heuristica
+            packs.append((mybox, calc_profit(mybox,taxrate), len(mybox)))
+            if bounds is not None and bounds.reached(packs[-1][1], gap): break # já é boa o bastante
+    else:
+        from concurrent.futures import ProcessPoolExecutor # só carregado quando há processos
+        # os itens vão para cada processo uma vez só, pelo inicializador
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_pool, \
+                                 initargs=(my_items,)) as pool:
+            answers = list(pool.map(_fit_task, [(f, s, taxrate) for f, s in combos]))
+        # só a melhor combinação (a primeira, em caso de empate) é montada aqui
+        winner = max(range(len(combos)), key=lambda k: answers[k][0])
+        f, s = combos[winner]
+        _, assign, order = answers[winner]
+        mybox = boxes_from_vectors(sort_items(my_items, s), assign, order, packed=packed)
+        packs = [(mybox if k == winner else None, profit, len(order)) \
+                 for k, (profit, assign, order) in enumerate(answers)]
 
-    for f in fit_option: #para cada heuristica
-        for s in sort_option: #para cada ordenação
-            mybox = fit(my_items,fit=f,sortedlist=s,verbose=False) #executa a heuristica
-            res = Result(list_of_boxes=mybox, fit_order=f,sort_order=s, \
-                         profit=calc_profit(mybox,taxrate),box_amount=len(mybox)) #salva o resultado em um objeto Result
-            results.append(res) # e coloca na lista de resultados
+    results = [] #lista dos resultados
+    for (f, s), (mybox, profit, amount) in zip(combos, packs):
+        res = Result(list_of_boxes=mybox, fit_order=f,sort_order=s, \
+                     profit=profit,box_amount=amount) #salva o resultado em um objeto Result
+        results.append(res) # e coloca na lista de resultados, na mesma ordem da serial
 
     results = sorted(results, key=attrgetter('profit'),reverse=True) #as melhores resultados são colocadas no topo da lista
     finalresult = results[0] #o melhor resultado é o primeiro
@@ -137,103 +394,347 @@ def multifit(file=None,taxrate=10,verbose=False):
     return finalresult #retorna o melhor resultado
 
 
+def sweep(items, tax_rates=(10,), min_taxes=(50,), base_box_costs=(5,), box_rates=(0.005,), \
+          fit_option=('first','best','worst','avoidtaxes'), sort_option=(True, False, 'cheapest', 'expensive'), \
+          packed=True):
+    """ Varredura de parâmetros de custo: o fit não depende da taxa, e o
+    avoidtaxes só depende do min_tax, então cada empacotamento é construído
+    uma única vez (uma vez por min_tax distinto no avoidtaxes) e avaliado em
+    todas as combinações de uma vez pelo profit_sweep.
+    Retorna a grade {(tax_rate, min_tax, base_box_cost, box_rate): {(fit, ordenação): (lucro, caixas)}} """
+    grid = {}
+    for t in tax_rates:
+        for m in min_taxes:
+            for base in base_box_costs:
+                for rate in box_rates: grid[t, m, base, rate] = {}
+    for f in fit_option:
+        for s in sort_option:
+            # o avoidtaxes precisa de um empacotamento para cada min_tax
+            builds = [(m, (m,)) for m in min_taxes] if f == 'avoidtaxes' else [(50, min_taxes)]
+            for build_tax, scored_taxes in builds:
+                mybox = fit(items, fit=f, sortedlist=s, min_tax=build_tax, packed=packed)
+                for key, profit in profit_sweep(mybox, tax_rates, scored_taxes, base_box_costs, box_rates).items():
+                    grid[key][f, s] = (profit, len(mybox))
+    return grid
+
+
+def sweep_best(grid):
+    """ Melhor combinação (fit, ordenação) de cada ponto da grade do sweep:
+    {parâmetros: ((fit, ordenação), lucro, caixas)}. Em caso de empate, fica
+    a primeira combinação, na ordem do multifit """
+    best = {}
+    for key, cell in grid.items():
+        combo = max(cell, key=lambda c: cell[c][0]) # max devolve o primeiro empatado
+        best[key] = (combo,) + cell[combo]
+    return best
+
+
 #------------------------------------------------------------------------------#
 #   Vizinhança Variável                                                        #
 # -----------------------------------------------------------------------------#
 
 
+class Move:
+    """ Move (Classe): movimento de vizinhança avaliado apenas pelo delta de
+    lucro das caixas que ele altera. A lista de caixas só é montada (apply)
+    para os movimentos que forem de fato devolvidos pela busca """
+    __slots__ = ('algo', 'order', 'pos', 'boxes', 'merged', 'profit', 'box_amount', 'fingerprint')
+
+    def __init__(self, algo, order, pos, boxes, profit, box_amount, merged=None, fingerprint=None):
+        self.algo = algo # 'top_to_bottom' (partir a caixa) ou 'repack' (juntar caixas)
+        self.order = order # ordem das caixas usada ('unordered' ou 'shuffle')
+        self.pos = pos # posição da caixa escolhida na lista ordenada
+        self.boxes = boxes # caixas (Box ou número da caixa) na ordem usada, compartilhada
+        self.merged = merged # posições das caixas absorvidas pelo repack
+        self.profit = profit
+        self.box_amount = box_amount
+        self.fingerprint = fingerprint # impressão digital da solução resultante (opcional)
+
+    def apply(self, solution):
+        """ Materializa o movimento numa nova solução. Numa lista de Box, as
+        caixas não alteradas são compartilhadas com a solução original """
+        boxes, pos = self.boxes, self.pos
+        if isinstance(solution, PackedSolution):
+            if self.algo == 'top_to_bottom': return solution.split(boxes, pos)
+            return solution.merge(boxes, pos, self.merged)
+        if self.algo == 'top_to_bottom':
+            sortbox = boxes[pos].items
+            minibox1, minibox2 = Box(), Box()
+            for m in sortbox[:len(sortbox)//2]: minibox1.add_item(m)
+            for m in sortbox[len(sortbox)//2:]: minibox2.add_item(m)
+            return boxes[:pos] + boxes[pos+1:] + [minibox1, minibox2]
+        removed = set(self.merged); removed.add(pos)
+        newbox = Box(boxes[pos].total_size)
+        for i in [pos] + self.merged:
+            newbox.items += boxes[i].items
+            newbox.used_size += boxes[i].used_size
+            newbox.total_value += boxes[i].total_value
+        new_boxes = [b for i, b in enumerate(boxes) if i not in removed]
+        if newbox.items: new_boxes.append(newbox)
+        return new_boxes
+
+    def to_result(self, result_h):
+        """ Gera o objeto Result do movimento """
+        return Result(list_of_boxes=self.apply(result_h.list_of_boxes), nb_algo=self.algo, \
+                      nb_order=self.order, nb_pos=self.pos, box_amount=self.box_amount, \
+                      profit=self.profit, fit_order=result_h.fit_order, sort_order=result_h.sort_order)
+
+
+class LazyResult(Result):
+    """ LazyResult (Classe): Result de um vizinho guardado apenas como Move.
+    A lista de caixas é montada no primeiro acesso a list_of_boxes """
+
+    def __init__(self, move, result_h):
+        self._move, self._base = move, result_h.list_of_boxes
+        Result.__init__(self, list_of_boxes=None, nb_algo=move.algo, nb_order=move.order, \
+                        nb_pos=move.pos, box_amount=move.box_amount, profit=move.profit, \
+                        fit_order=result_h.fit_order, sort_order=result_h.sort_order)
+
+    @property
+    def list_of_boxes(self):
+        if self._boxes is None and self._move is not None:
+            self._boxes = self._move.apply(self._base)
+            self._move = self._base = None # libera a referência à solução de origem
+        return self._boxes
+
+    @list_of_boxes.setter
+    def list_of_boxes(self, boxes):
+        self._boxes = boxes
+        if boxes is not None: self._move = self._base = None
+
+
+class CandidatePool:
+    """ CandidatePool (Classe): heap limitado com os size melhores candidatos
+    (Result ou Move) pelo lucro. Em caso de empate, fica o que chegou antes,
+    como na ordenação estável. size=None guarda todos no heap; size=0 não
+    guarda nenhum. Com dominated=True, os que ficam fora do heap são
+    guardados só como descritores (o próprio Move, O(1) cada) e vêm depois
+    dos melhores """
+
+    def __init__(self, size=None, dominated=False):
+        if size is not None and size < 0: raise ValueError("tamanho do heap negativo")
+        self.size = size
+        self.heap = []
+        self.dominated = [] if dominated else None
+        self.pushed = 0
+
+    def push(self, candidate):
+        self.pushed += 1
+        entry = (candidate.profit, -self.pushed, candidate) # -pushed desempata e é único
+        if self.size is None or len(self.heap) < self.size: heappush(self.heap, entry); return
+        if self.heap and entry[:2] > self.heap[0][:2]: entry = heapreplace(self.heap, entry) # sai o pior do heap
+        if self.dominated is not None: self.dominated.append(entry)
+
+    def ranked(self):
+        """ Candidatos do melhor para o pior. Os dominados nunca passam dos do
+        heap, então a lista é a mesma de uma ordenação estável de todos """
+        ranked = [entry[2] for entry in sorted(self.heap, reverse=True)]
+        if self.dominated: ranked += [entry[2] for entry in sorted(self.dominated, reverse=True)]
+        return ranked
+
+
+def box_columns(solution, halves=False, hashes=False):
+    """ Extrai de uma solução (lista de Box ou PackedSolution) as colunas
+    usadas na avaliação dos movimentos: caixas, espaço usado, valor, tamanho
+    máximo, se a caixa tem itens e, opcionalmente, os totais de cada metade
+    da caixa (tamanho1, valor1, tamanho2, valor2) e as somas dos hashes dos
+    itens (caixa, metade1, metade2) usadas nas impressões digitais """
+    if isinstance(solution, PackedSolution):
+        boxes = list(range(len(solution)))
+        groups = solution.members()
+        used, value = list(solution.used), list(solution.value)
+        room = [solution.box_size] * len(boxes)
+        filled = [bool(groups[b]) for b in boxes]
+        contents = [[(solution.sizes[i], solution.values[i]) for i in groups[b]] for b in boxes] \
+                   if halves or hashes else None
+    else:
+        boxes = solution
+        used = [b.used_size for b in boxes]
+        value = [b.total_value for b in boxes]
+        room = [b.total_size for b in boxes]
+        filled = [bool(b.items) for b in boxes]
+        contents = [[(m.size, m.value) for m in b.items] for b in boxes] if halves or hashes else None
+    parts = None
+    if halves:
+        parts = []
+        for inside in contents:
+            half = len(inside)//2
+            size1 = value1 = size2 = value2 = 0
+            for sz, vl in inside[:half]: size1 += sz; value1 += vl
+            for sz, vl in inside[half:]: size2 += sz; value2 += vl
+            parts.append((size1, value1, size2, value2))
+    sums = None
+    if hashes:
+        sums = []
+        for inside in contents:
+            item_h = [item_hash(sz, vl) for sz, vl in inside]
+            first = sum(item_h[:len(item_h)//2])
+            total = first + sum(item_h[len(item_h)//2:])
+            sums.append((total, first, total - first))
+    return boxes, used, value, room, filled, parts, sums
+
+
+def budget_limit(budget, amount):
+    """ Quantos movimentos podem ser avaliados dentro do orçamento """
+    if budget is None: return amount
+    remaining = budget.remaining_evals()
+    return amount if remaining is None else min(amount, remaining)
+
+
+def split_moves(boxes, parts, profits, base_profit, order, taxrate=10, budget=None, \
+                sums=None, base_fp=0):
+    """ top_to_bottom: avalia partir cada caixa em duas metades (pela ordem
+    dos itens), em O(1) por movimento a partir dos totais das metades.
+    Gera os movimentos um a um; com um SearchBudget, para quando ele acabar.
+    Com as somas de hashes (sums), calcula também a impressão digital """
+    amount = len(boxes) + 1
+    fp = None
+    for box in range(budget_limit(budget, len(boxes))):
+        if budget is not None and not box & 255 and budget.exhausted(): break
+        size1, value1, size2, value2 = parts[box]
+        profit = base_profit - profits[box] + box_profit(size1, value1, tax_rate=taxrate) \
+                 + box_profit(size2, value2, tax_rate=taxrate)
+        if sums is not None:
+            total, first, second = sums[box]
+            fp = (base_fp - box_hash(total) + box_hash(first) + box_hash(second)) & FP_MASK
+        if budget is not None: budget.spend()
+        yield Move('top_to_bottom', order, box, boxes, profit, amount, fingerprint=fp)
+
+
+def merge_moves(boxes, used, value, room, filled, profits, base_profit, order, taxrate=10, \
+                budget=None, sums=None, base_fp=0, merge='first'):
+    """ repack: avalia, para cada caixa, absorver as outras caixas que
+    couberem nela. As caixas ficam numa MergeTree pelo espaço usado, então
+    cada caixa absorvida é achada em O(log n); as absorvidas viram lápides
+    e são restauradas antes do próximo movimento.
+        merge='first' - absorve as caixas seguintes na ordem da lista (first fit)
+        merge='best' - absorve sempre a maior caixa que ainda couber (best fit)
+    Gera os movimentos um a um; com um SearchBudget, para quando ele acabar.
+    Com as somas de hashes (sums), calcula também a impressão digital """
+    fp = None
+    if merge == 'best': # folhas em ordem de espaço usado; empate: a primeira caixa
+        leaf_box = sorted(range(len(boxes)), key=lambda i: (used[i], -i))
+    else: leaf_box = list(range(len(boxes))) # folhas na ordem da lista
+    box_leaf = [0] * len(boxes)
+    for leaf, i in enumerate(leaf_box): box_leaf[i] = leaf
+    tree = MergeTree([used[i] for i in leaf_box])
+    find = tree.last_leq if merge == 'best' else tree.first_leq
+
+    for box in range(budget_limit(budget, len(boxes))):
+        if budget is not None and budget.exhausted(): break
+        new_used, new_value = used[box], value[box]
+        has_items = filled[box]
+        profit = base_profit - profits[box]
+        merged = []
+        tree.remove(box_leaf[box]) # a própria caixa não se absorve
+        leaf = find(room[box] - new_used)
+        while leaf >= 0:
+            i = leaf_box[leaf]
+            tree.remove(leaf)
+            merged.append(i)
+            new_used += used[i]
+            new_value += value[i]
+            profit -= profits[i]
+            has_items = has_items or filled[i]
+            leaf = find(room[box] - new_used)
+        for i in merged: tree.update(box_leaf[i], used[i]) # desfaz as lápides
+        tree.update(box_leaf[box], used[box])
+        if has_items: profit += box_profit(new_used, new_value, tax_rate=taxrate)
+        amount = len(boxes) - 1 - len(merged) + (1 if has_items else 0)
+        if sums is not None:
+            fp, new_sum = base_fp - box_hash(sums[box][0]), sums[box][0]
+            for i in merged: fp -= box_hash(sums[i][0]); new_sum += sums[i][0]
+            if has_items: fp += box_hash(new_sum)
+            fp &= FP_MASK
+        if budget is not None: budget.spend()
+        yield Move('repack', order, box, boxes, profit, amount, merged, fingerprint=fp)
+
+
 def nbhood(result_h, algo='auto', \
-           taxrate=10, randomseed="i_will_survive_this", verbose=False, meta=False):
-    """ Recebe uma Solução e executa a heurística mais aplicável para gerar sua vizinhança. """
+           taxrate=10, randomseed="i_will_survive_this", verbose=False, meta=False, stats=None, \
+           budget=None, pool_size=32, cache=None, tabu=None, merge='first'):
+    """ Recebe uma Solução e executa a heurística mais aplicável para gerar sua vizinhança.
+    Cada vizinho é um Move, pontuado pelo delta de lucro das caixas alteradas;
+    apenas o(s) resultado(s) devolvido(s) são materializados como Result.
+    A solução pode ser uma lista de Box ou uma PackedSolution.
+    stats: SearchStats opcional, que acumula contadores e tempos da chamada
+    budget: SearchBudget opcional; ao acabar, a vizinhança fica parcial
+    pool_size: quantos melhores vizinhos ficam no heap (None = todos, 0 =
+    nenhum). Com meta=True os demais também são devolvidos, depois deles e
+    na mesma ordem, mas guardados só como Move; todos vêm como LazyResult,
+    cujas caixas só são montadas quando acessadas
+    cache: SolutionCache opcional; vizinhos já avaliados antes são descartados
+    tabu: TabuList opcional; vizinhos na lista tabu são descartados
+    merge: como o repack escolhe as caixas absorvidas, 'first' ou 'best' (ver merge_moves) """
 
     #Ordem das Caixas: escolhe as ordens que serão usadas na busca de vizinhança
     order = ['unordered','shuffle'] #'smallest','expensive','biggest','cheapest', 
-    results = []
-    results.append(result_h) #adiciona o resultado inicial na lista
-    boxes_ord = copy.deepcopy(result_h.list_of_boxes) #faz uma cópia profunda (incl. todos as variaveis e referências da lista de caixas)
-    
+
     if algo == 'auto': #caso nenhum algoritimo especifico seja selecionado
         if result_h.fit_order == 'avoidtaxes': algo = 'repack' # o repack é consideralvemente mais eficiente com mais caixas
         else: algo = 'top_to_bottom' # já o top_to_bottom é melhor com caixas cheias
 
-    if algo == 'top_to_bottom':
-        
+    if stats is not None: stats.neighbourhoods += 1; clock = perf_counter()
+    remember = cache is not None or tabu is not None # usa impressões digitais
+    base_boxes, used, value, room, filled, parts, sums = box_columns(result_h.list_of_boxes, \
+                                                halves=(algo == 'top_to_bottom'), hashes=remember)
+    base_fp = sum(box_hash(h[0]) for h in sums) & FP_MASK if remember else 0
+    base_profits = [box_profit(u, v, tax_rate=taxrate) for u, v in zip(used, value)]
+    base_profit = sum(base_profits) # lucro da solução, os movimentos só calculam a diferença
+    perm = list(range(len(base_boxes))) # permutação da ordem das caixas
+    """ só os melhores vizinhos ficam guardados; a solução inicial entra primeiro,
+    para vir antes de qualquer movimento de mesmo valor """
+    pool = CandidatePool(pool_size if meta else (5 if verbose else 1), dominated=meta)
+    pool.push(result_h)
+    if cache is not None and not cache.seen(base_fp, taxrate): cache.add(base_fp, result_h.profit, taxrate)
+    skipped = 0
+
+    def consider(move): # guarda o movimento, se ele não foi visto/proibido antes
+        nonlocal skipped
+        if remember:
+            if tabu is not None and move.fingerprint in tabu: skipped += 1; return
+            if cache is not None:
+                if cache.seen(move.fingerprint, taxrate): skipped += 1; return
+                cache.add(move.fingerprint, move.profit, taxrate)
+        pool.push(move)
+
+    for o in order:
+        if o == 'unordered': pass
+        if o == 'shuffle': random.seed(randomseed); random.shuffle(perm)
+        if budget is not None and budget.exhausted(): break
+        boxes_ord = [base_boxes[i] for i in perm]
+        profits = [base_profits[i] for i in perm]
+
         """ desempacota a *n caixa selecionada e a parte em duas de tamanho menor
          só trás melhorias tangiveis se a heuristica usada for first,best ou worst fit """
-        
-        for o in order:
-            if o == 'unordered': pass
-            #if o == 'biggest': boxes_ord = sorted(boxes_ord, key=lambda x: x.used_size, reverse=True)
-            #if o == 'smallest': boxes_ord = sorted(boxes_ord, key=lambda x: x.used_size)
-            #if o == 'expensive': boxes_ord = sorted(boxes_ord, key=lambda x: x.total_value, reverse=True)
-            #if o == 'cheapest': boxes_ord = sorted(boxes_ord, key=lambda x: x.total_value)
-            if o == 'shuffle': random.seed(randomseed); random.shuffle(boxes_ord)
-            
-            """ será calculada a vizinhança para TODAS as possibilidades de execução, ou seja, 
-            o loop percorre todos os itens na caixa"""
-            for box in range(len(boxes_ord)): 
-                boxes = copy.deepcopy(boxes_ord) #faz uma copia da lista de caixas (para não alterar a original)
-                sortbox = boxes[box].items #extrai a lista de itens da caixa
-                # partir em duas
-                mini1 = sortbox[:len(sortbox)//2]  #pega a primeira parte da lista de itens
-                mini2 = sortbox[len(sortbox)//2:] #pega a segunda parte dela
-                boxes.pop(box) #remove a caixa que foi partida da lista de caixas
-                minibox1,minibox2 = Box(), Box() #inicializa as duas caixas
-                for m in mini1: #adiciona os tens em suas respectivas caixas
-                    minibox1.add_item(m)
-                for m in mini2:
-                    minibox2.add_item(m)
-                # coloca os itens na caixa principal
-                boxes.append(minibox1)
-                boxes.append(minibox2)
-
-                """ gera um novo resultado, e o coloca na lista, (função de avalição sendo calc_profit) """
-                res = Result(list_of_boxes=copy.deepcopy(boxes), nb_algo=algo, \
-                            nb_order=o, nb_pos=box, box_amount=len(boxes), profit=calc_profit(boxes,taxrate), \
-                            fit_order=result_h.fit_order, sort_order=result_h.sort_order)                        
-                results.append(res)
-
-    if algo == "repack":
+        if algo == 'top_to_bottom':
+            for move in split_moves(boxes_ord, [parts[i] for i in perm], profits, base_profit, \
+                                    o, taxrate, budget, [sums[i] for i in perm] if remember else None, \
+                                    base_fp): consider(move)
+
         """ tenta juntar várias caixas pequenas em uma caixa grande. 
         ps: essa heurista só faz efeito notável no algoritimo avoidtaxes """
+        if algo == 'repack':
+            for move in merge_moves(boxes_ord, [used[i] for i in perm], [value[i] for i in perm], \
+                                    [room[i] for i in perm], [filled[i] for i in perm], \
+                                    profits, base_profit, o, taxrate, budget, \
+                                    [sums[i] for i in perm] if remember else None, base_fp, \
+                                    merge): consider(move)
 
-        for o in order:
-            if o == 'unordered': pass
-            #if o == 'biggest': boxes_ord = sorted(boxes_ord, key=lambda x: x.used_size, reverse=True)
-            #if o == 'smallest': boxes_ord = sorted(boxes_ord, key=lambda x: x.used_size)
-            #if o == 'expensive': boxes_ord = sorted(boxes_ord, key=lambda x: x.total_value, reverse=True)
-            #if o == 'cheapest': boxes_ord = sorted(boxes_ord, key=lambda x: x.total_value)
-            if o == 'shuffle': random.seed(randomseed); random.shuffle(boxes_ord)
-            
-            """ assim como no "top_to_bottom" será calculada a vizinhança para TODAS as possibilidades de execução, ou seja, 
-             o loop percorre todos os itens na caixa """
-            for box in range(len(boxes_ord)):
-                boxes = copy.deepcopy(boxes_ord) #faz uma cópia da lista de caixas original
-                newbox = boxes[box] # captura o conteudo de uma caixa na variavel newbox
-                boxes.pop(box) # e remove a caixa da lista
-
-                add_phase = True # fase de adicionar caixas à caixa
-
-                while add_phase: #enquanto ainda podemos adicionar itens
-                    for i in range(len(boxes)): #procuramos por o primeira caixa que caiba dentro da caixa escolhida
-                        if newbox.used_size + boxes[i].used_size <= newbox.total_size: #caso ela caiba, adiciona na caixa
-                            newbox.items += boxes[i].items #atualiza os valores da caixa
-                            newbox.used_size += boxes[i].used_size
-                            newbox.total_value += boxes[i].total_value
-                            boxes.pop(i);break #para o loop caso achado, e tira a caixa que foi mergida da lista.
-                    else: add_phase = False #caso não ache mais caixas que caibam nela, termina a fase de adição
-                if newbox.items: boxes.append(newbox) # se a nova caixa tiver algo dentro, adiciona na lista de caixas.
-                # salvamos o resultado num objeto result e calculamos a função de avaliação.
-                res = Result(list_of_boxes=copy.deepcopy(boxes), nb_algo=algo, \
-                            nb_order=o, nb_pos=box, box_amount=len(boxes), profit=calc_profit(boxes,taxrate), \
-                            fit_order=result_h.fit_order, sort_order=result_h.sort_order)                        
-                results.append(res) #salvamos o resultado na lista de resultados
-
-    """ organizamos os resultados na ordem do melhor valor da função de avaliação """
-    results = sorted(results, key=attrgetter('profit'),reverse=True)
+    if stats is not None:
+        stats.neighbours += pool.pushed - 1 + skipped
+        stats.skipped += skipped
+        now = perf_counter(); stats.eval_time += now - clock; clock = now
+
+    """ organizamos os movimentos na ordem do melhor valor da função de avaliação """
+    ranked = pool.ranked()
+    if stats is not None: now = perf_counter(); stats.sort_time += now - clock; clock = now
+    if meta: results = [LazyResult(r, result_h) if isinstance(r, Move) else r for r in ranked]
+    else: results = [r.to_result(result_h) if isinstance(r, Move) else r for r in ranked]
+    if stats is not None: stats.copy_time += perf_counter() - clock
     if verbose:  # se verboso, imprimimos os cinco melhores resultados
-        for i in range(5):
-            results[i].print_result()
+        for r in results[:5]:
+            r.print_result()
         print("- Melhor Vizinhança: ",end=''); results[0].print_result()        
     finalresult = results[0] # melhor resultado é o primeiro da lista
 
@@ -241,50 +742,114 @@ def nbhood(result_h, algo='auto', \
     else: return finalresult #se só queremos o melhor valor, retornamos apenas ele
 
 
-def vnd(solution, taxrate=10, algo='auto', randomseed="i_will_survive_this",\
-        verbose = False):
-    """ Descida de Vizinhança Variável:
-    Executa a busca de vizinhança várias vezes até a achar um valor ótimo onde não é possível melhorar """
-
-    old_profit = solution.profit # salva o valor antigo, para viés de comparação
+def anytime_vnd(solution, taxrate=10, algo='auto', randomseed="i_will_survive_this",\
+                verbose=False, stats=None, time_limit=None, max_evals=None, budget=None, \
+                cache=None, tabu=None):
+    """ Descida de Vizinhança Variável como gerador: devolve (yield) cada
+    solução melhor assim que ela é achada. Pode ser interrompida a qualquer
+    momento; a última solução recebida é a melhor até então.
+    time_limit: limite em segundos, max_evals: limite de vizinhos avaliados
+    cache, tabu: SolutionCache/TabuList opcionais, para não revisitar soluções """
+    if tabu is not None: tabu.add(fingerprint(solution.list_of_boxes))
+    if budget is None and (time_limit is not None or max_evals is not None):
+        budget = SearchBudget(time_limit, max_evals)
     it = 0 # contador de execuções de vizinhança
 
-    while True: #enquanto o um ótimo não for achado
+    while budget is None or not budget.exhausted(): #enquanto o um ótimo não for achado
         if verbose: print("> Visitando Vizinhança " + str(it+1))
         new_result = nbhood(solution, algo=algo, taxrate=taxrate, randomseed=randomseed,\
-                            verbose=verbose) #roda o algoritimo da vizinhança
+                            verbose=verbose, stats=stats, budget=budget, cache=cache, tabu=tabu) #roda o algoritimo da vizinhança
         if new_result.profit > solution.profit: #se o resultado achado for melhor que o valor anterior
             solution = new_result # atualiza o valor de solução
             it += 1 #atualiza o contador da vizinhança
+            if stats is not None: stats.accepted += 1
+            if tabu is not None: tabu.add(fingerprint(solution.list_of_boxes))
+            yield solution
         else: break #caso contrário, pare
+
+
+def vnd(solution, taxrate=10, algo='auto', randomseed="i_will_survive_this",\
+        verbose = False, stats=None, time_limit=None, max_evals=None, on_improve=None, \
+        cache=None, tabu=None, gap=None, bounds=None):
+    """ Descida de Vizinhança Variável:
+    Executa a busca de vizinhança várias vezes até a achar um valor ótimo onde não é possível melhorar
+    stats: SearchStats opcional (ou True para criar um), devolvido em Result.stats
+    time_limit, max_evals: orçamento em segundos e em vizinhos avaliados
+    on_improve: função chamada com cada nova melhor solução; se retornar False, a busca para.
+    cache, tabu: SolutionCache/TabuList opcionais (os acertos ficam em cache.hits/misses
+                 e tabu.hits)
+    gap: para quando o lucro ficar a no máximo gap (fração) do limitante superior
+    (0 = só no limitante); bounds: Bounds já calculado (senão vem da solução)
+    Ao estourar o orçamento, ou com Ctrl+C, retorna a melhor solução achada até então """
+    if stats is True: stats = SearchStats()
+    if gap is not None and bounds is None: bounds = solution_bounds(solution.list_of_boxes, taxrate)
+    if bounds is not None and bounds.reached(solution.profit, gap): return solution # já comprovadamente boa
+
+    old_profit = solution.profit # salva o valor antigo, para viés de comparação
+    it = 0 # contador de execuções de vizinhança
+
+    try:
+        for new_result in anytime_vnd(solution, taxrate, algo, randomseed, verbose, stats, \
+                                      time_limit, max_evals, cache=cache, tabu=tabu):
+            solution = new_result # atualiza o valor de solução
+            it += 1 #atualiza o contador da vizinhança
+            if on_improve is not None and on_improve(solution) is False: break
+            if bounds is not None and bounds.reached(solution.profit, gap): break
+    except KeyboardInterrupt: pass # interrompido: fica com a melhor até agora
     if verbose:
         print()
         print(">> Melhor Resultado Final:")
         solution.print_result()
         print("Melhoria: " + str(old_profit) + " ---> " + str(solution.profit) + " (+" + str(solution.profit - old_profit) + ")")
         print("Vizinhanças Visitadas para geração do resultado: " + str(it))
+    if stats is not None: solution.stats = stats
     return solution #retorna a melhor solução (objeto Result)
 
 
 def smarter_vnd(solutions, taxrate=10, algo='auto', randomseed="i_wish_i_was_dead",\
-        verbose = False):
-    """ Metaheurística: VND com Backtracking """
+        verbose = False, stats=None, time_limit=None, max_evals=None, on_improve=None,\
+        pool_size=32, cache=None, tabu=None, gap=None, bounds=None):
+    """ Metaheurística: VND com Backtracking
+    stats: SearchStats opcional (ou True para criar um), também guardado na
+    melhor solução encontrada (Result.stats)
+    time_limit, max_evals, on_improve: como no vnd. Se a busca parar antes do
+    fim (orçamento, on_improve ou Ctrl+C), a melhor solução vai para o início
+    da lista retornada
+    pool_size: como no nbhood; os vizinhos fora do heap continuam na lista do
+    backtracking, guardados só como Move
+    cache, tabu: SolutionCache/TabuList opcionais, para não revisitar soluções
+    gap, bounds: como no vnd, para ao chegar perto o bastante do limitante """
+    if stats is True: stats = SearchStats()
+    if gap is not None and bounds is None: bounds = solution_bounds(solutions[0].list_of_boxes, taxrate)
+    budget = SearchBudget(time_limit, max_evals) if time_limit is not None or max_evals is not None else None
+    stopped = False # se a busca foi interrompida antes do fim
     old_profit = solutions[0].profit #função de avaliação inicial
     optimal_solution = solutions[0] #solução otima inicial
+    if tabu is not None: tabu.add(fingerprint(optimal_solution.list_of_boxes))
+    if bounds is not None and bounds.reached(optimal_solution.profit, gap): return solutions
     it,bk = 0,0 #contadores de vizinhanças visitadas e backtracking
 
     while solutions: #enquanto ouver soluções na lista
+        if budget is not None and budget.exhausted(): stopped = True; break
         if verbose: print("> Visitando Vizinhança " + str(it+1))
-        new_solutions = nbhood(solutions[0], algo=algo, taxrate=taxrate, randomseed=randomseed,\
-                            verbose=verbose, meta=True) #procura as vizinhanças locais, e salva a a lista num objeto
+        try:
+            new_solutions = nbhood(solutions[0], algo=algo, taxrate=taxrate, randomseed=randomseed,\
+                                verbose=verbose, meta=True, stats=stats, budget=budget, \
+                                pool_size=pool_size, cache=cache, tabu=tabu) #procura as vizinhanças locais, e salva a a lista num objeto
+        except KeyboardInterrupt: stopped = True; break # interrompido: fica com a melhor até agora
 
         if new_solutions[0].profit > optimal_solution.profit: # o se o valor da melhor nova solução for melhor que a solução otima anterior
             solutions = new_solutions #atualiza o valor da lista de soluções
             optimal_solution = solutions[0] # a nova solução otima é a primeira da lista
             it += 1 #atualiza o contador de vizinhanaça
+            if stats is not None: stats.accepted += 1
+            if tabu is not None: tabu.add(fingerprint(optimal_solution.list_of_boxes))
+            if on_improve is not None and on_improve(optimal_solution) is False: stopped = True; break
+            if bounds is not None and bounds.reached(optimal_solution.profit, gap): stopped = True; break
             bk = 0 #reseta o contador de backtracking
         else:
             bk += 1 #incrementa o backgracking
+            if stats is not None: stats.backtracks += 1
             if bk == 20: break # limita o backtracking em 20 vizinhanças, por questões de tempo computacional
             print("Fazendo Backtracking: " + str(bk)) 
             solutions.pop(0) #remove a solução testada da lista.
@@ -297,23 +862,46 @@ def smarter_vnd(solutions, taxrate=10, algo='auto', randomseed="i_wish_i_was_dea
         print("Melhoria: " + str(old_profit) + " ---> " + str(optimal_solution.profit) + " (+" + str(optimal_solution.profit - old_profit) + ")")
         print("Vizinhanças Visitadas para geração do resultado: " + str(it))
 
+    if stopped and optimal_solution is not (solutions[0] if solutions else None):
+        solutions = [optimal_solution] + [x for x in solutions if x is not optimal_solution]
+    if stats is not None: optimal_solution.stats = stats
     return solutions
 
 
 
 def smarter_vnd_worsening(solutions, taxrate=10, algo='auto', randomseed="i_will_survive_this",\
-        verbose = False):
-    """ Metaheurística: VND com Backtracking, com movimentos em soluções suboptimas """
+        verbose = False, stats=None, time_limit=None, max_evals=None, on_improve=None,\
+        pool_size=32, cache=None, tabu=None, gap=None, bounds=None):
+    """ Metaheurística: VND com Backtracking, com movimentos em soluções suboptimas
+    stats: SearchStats opcional (ou True para criar um), também guardado na
+    melhor solução encontrada (Result.stats)
+    time_limit, max_evals, on_improve: como no vnd. Se a busca parar antes do
+    fim (orçamento, on_improve ou Ctrl+C), a melhor solução vai para o início
+    da lista retornada
+    pool_size: como no nbhood; os vizinhos fora do heap continuam na lista do
+    backtracking, guardados só como Move
+    cache, tabu: SolutionCache/TabuList opcionais, para não revisitar soluções
+    gap, bounds: como no vnd, para ao chegar perto o bastante do limitante """
+    if stats is True: stats = SearchStats()
+    if gap is not None and bounds is None: bounds = solution_bounds(solutions[0].list_of_boxes, taxrate)
+    budget = SearchBudget(time_limit, max_evals) if time_limit is not None or max_evals is not None else None
+    stopped = False # se a busca foi interrompida antes do fim
     old_profit = solutions[0].profit #função de avaliação inicial
     optimal_solution = solutions[0] #solução otima inicial
+    if tabu is not None: tabu.add(fingerprint(optimal_solution.list_of_boxes))
+    if bounds is not None and bounds.reached(optimal_solution.profit, gap): return solutions
     it,bk = 0,0 #contadores de vizinhanças visitadas e backtracking
     global_maximum = solutions[0]
     older_solution = solutions[0]
 
     while solutions: #enquanto ouver soluções na lista
+        if budget is not None and budget.exhausted(): stopped = True; break
         if verbose: print("> Visitando Vizinhança " + str(it+1))
-        new_solutions = nbhood(solutions[0], algo=algo, taxrate=taxrate, randomseed=randomseed,\
-                            verbose=verbose, meta=True) #procura as vizinhanças locais, e salva a a lista num objeto
+        try:
+            new_solutions = nbhood(solutions[0], algo=algo, taxrate=taxrate, randomseed=randomseed,\
+                                verbose=verbose, meta=True, stats=stats, budget=budget, \
+                                pool_size=pool_size, cache=cache, tabu=tabu) #procura as vizinhanças locais, e salva a a lista num objeto
+        except KeyboardInterrupt: stopped = True; break # interrompido: fica com a melhor até agora
 
         if new_solutions[0].profit > optimal_solution.profit: # o se o valor da melhor nova solução for melhor que a solução otima anterior
             solutions = new_solutions #atualiza o valor da lista de soluções
@@ -322,9 +910,14 @@ def smarter_vnd_worsening(solutions, taxrate=10, algo='auto', randomseed="i_will
             if optimal_solution.profit > global_maximum.profit:
                 global_maximum = optimal_solution
             it += 1 #atualiza o contador de vizinhanaça
+            if stats is not None: stats.accepted += 1
+            if tabu is not None: tabu.add(fingerprint(optimal_solution.list_of_boxes))
+            if on_improve is not None and on_improve(optimal_solution) is False: stopped = True; break
+            if bounds is not None and bounds.reached(optimal_solution.profit, gap): stopped = True; break
             bk = 0 #reseta o contador de backtracking
         else:
             bk += 1 #incrementa o backgracking
+            if stats is not None: stats.backtracks += 1
             if bk == 10: 
                 if global_maximum.profit > optimal_solution.profit:
                     optimal_solution = global_maximum
@@ -343,7 +936,594 @@ def smarter_vnd_worsening(solutions, taxrate=10, algo='auto', randomseed="i_will
         print("Melhoria: " + str(old_profit) + " ---> " + str(optimal_solution.profit) + " (+" + str(optimal_solution.profit - old_profit) + ")")
         print("Vizinhanças Visitadas para geração do resultado: " + str(it))
 
+    if stopped and global_maximum.profit > optimal_solution.profit: optimal_solution = global_maximum
+    if stopped and optimal_solution is not (solutions[0] if solutions else None):
+        solutions = [optimal_solution] + [x for x in solutions if x is not optimal_solution]
+    if stats is not None: optimal_solution.stats = stats
     return solutions
 
 
 
+
+
+#------------------------------------------------------------------------------#
+#   Múltiplos Inícios                                                          #
+# -----------------------------------------------------------------------------#
+
+
+_ms_items = None # lista de itens de cada processo do multistart_vnd
+_ms_best = None # lucro da melhor solução entre todos os processos (mp.Value)
+
+
+def _init_multistart(items, best):
+    """ Inicializador dos processos: recebe os itens e o incumbente compartilhado """
+    global _ms_items, _ms_best
+    _ms_items, _ms_best = items, best
+
+
+def start_solution(items, start, taxrate=10):
+    """ Constrói a solução inicial de um início (fit, ordenação, semente).
+    Com semente, os itens são embaralhados por um gerador próprio
+    (random.Random), sem mexer no estado global do random """
+    f, s, seed = start
+    if seed is not None:
+        items = list(items)
+        random.Random(seed).shuffle(items)
+        s = 'shuffle'
+    boxes = fit(items, fit=f, sortedlist=False if seed is not None else s)
+    return Result(list_of_boxes=boxes, fit_order=f, sort_order=s, \
+                  profit=calc_profit(boxes, taxrate), box_amount=len(boxes))
+
+
+def _multistart_task(args):
+    """ Executa um início: constrói a solução e roda o vnd com a sua própria
+    semente. A cada melhoria o incumbente compartilhado é atualizado; se o
+    lucro ficar abaixo do incumbente por mais que hopeless (fração), a
+    busca para. Só devolve a solução se ela empatar com o incumbente, já
+    serializada com Result.to_bytes (bem menor que o pickle das caixas) """
+    k, start, taxrate, algo, randomseed, deadline, hopeless = args
+    best = _ms_best
+
+    def share(solution): # atualiza o incumbente e diz se vale continuar
+        with best.get_lock():
+            if solution.profit > best.value: best.value = solution.profit
+            incumbent = best.value
+        return hopeless is None or solution.profit >= incumbent - hopeless * abs(incumbent)
+
+    solution = start_solution(_ms_items, start, taxrate)
+    if share(solution):
+        time_limit = None if deadline is None else max(deadline - time(), 0)
+        solution = vnd(solution, taxrate=taxrate, algo=algo, randomseed=randomseed, \
+                       time_limit=time_limit, on_improve=share)
+    profit = solution.profit
+    return k, profit, solution.to_bytes() if profit >= best.value else None
+
+
+def multistart_vnd(file=None, items=None, taxrate=10, workers=None, restarts=16, algo='auto', \
+                   randomseed="i_will_survive_this", time_limit=None, hopeless=0.02, verbose=False):
+    """ VND com múltiplos inícios em paralelo:
+    parte das 16 soluções do multifit (fit x ordenação) e de restarts soluções
+    com os itens embaralhados, e roda um vnd a partir de cada uma, distribuídos
+    entre os processos. Cada execução tem a sua semente (randomseed:k), então
+    os embaralhamentos do nbhood são independentes entre si.
+    Parametros:
+        workers: número de processos (1 = execução serial, None = todos os núcleos)
+        time_limit: tempo total em segundos; as execuções que passarem dele
+                    devolvem a melhor solução que tiverem
+        hopeless: fração abaixo do melhor lucro global a partir da qual uma
+                  execução é abandonada (None = nunca abandona)
+    Retorna o melhor Result encontrado """
+    my_items = items if items is not None else load_from_file(file)
+    fit_option = ['first','best','worst','avoidtaxes']
+    sort_option = [True, False, 'cheapest', 'expensive']
+    starts = [(f, s, None) for f in fit_option for s in sort_option]
+    starts += [(fit_option[r % len(fit_option)], False, str(randomseed) + ':restart:' + str(r)) \
+               for r in range(restarts)]
+    deadline = None if time_limit is None else time() + time_limit
+    tasks = [(k, start, taxrate, algo, str(randomseed) + ':' + str(k), deadline, hopeless) \
+             for k, start in enumerate(starts)]
+    import multiprocessing as mp
+    from concurrent.futures import ProcessPoolExecutor
+    best = mp.Value('q', -2**62) # lucro do incumbente, compartilhado entre os processos
+
+    if workers == 1:
+        _init_multistart(my_items, best)
+        outcomes = map(_multistart_task, tasks)
+    else:
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_multistart, \
+                                   initargs=(my_items, best))
+        outcomes = pool.map(_multistart_task, tasks)
+
+    finalresult = None
+    try:
+        for k, profit, solution in outcomes:
+            if verbose: print(str(profit) + ' :' + str(starts[k][0]) + ',' + str(starts[k][1] if starts[k][2] is None else 'shuffle'))
+            if solution is not None and (finalresult is None or profit > finalresult.profit):
+                finalresult = Result.from_bytes(solution)
+    finally:
+        if workers != 1: pool.shutdown()
+    if verbose: print("- Melhor: ", end=''); finalresult.print_result()
+    return finalresult
+
+
+#------------------------------------------------------------------------------#
+#   Alterações Incrementais                                                    #
+# -----------------------------------------------------------------------------#
+
+
+class BoxIndex:
+    """ BoxIndex (Classe): índice das caixas de uma solução para as alterações
+    incrementais. Cada caixa tem uma vaga fixa, na ordem da lista; caixas
+    removidas viram lápides (None) e as novas entram no fim, então as vagas
+    não mudam quando a lista do Result é compactada. Guarda:
+        first, taxed - FirstFitTree do espaço livre de todas as caixas e só
+                       das taxadas (first e worst fit, caros no avoidtaxes)
+        notax - NoTaxFitTree das caixas que ainda aceitam itens sem taxa
+        best - lista ordenada de (espaço livre, vaga), para o best fit
+        where, kinds - vaga de cada item (pelo id) e as vagas de cada
+                       (tamanho, valor), para achar os itens a retirar;
+                       montados na primeira retirada
+    O índice passa de um Result para o seguinte (Result._index), e cada
+    alteração custa O(log n) por item ou caixa alterada. Ele supõe que as
+    caixas do Result não são alteradas fora de add_items/remove_items """
+
+    def __init__(self, boxes, box_size=1000, min_tax=50):
+        self.box_size, self.min_tax = box_size, min_tax
+        self.boxes = list(boxes) # vaga -> caixa, None nas lápides
+        self.live = len(self.boxes)
+        self.source = None # lista de caixas do Result que o índice descreve
+        self.where = self.kinds = None # montados só na primeira retirada (items)
+        self._build(max(2 * len(self.boxes), 16))
+
+    def _keys(self, b):
+        """ Folgas da caixa em cada árvore (-1 tira a caixa da árvore) """
+        if b is None: return -1, -1, -1, -1
+        room = b.total_size - b.used_size
+        if b.total_value > self.min_tax: return room, room, -1, -1
+        return room, -1, room if b.used_size <= self.min_tax else -1, self.min_tax - b.total_value
+
+    def _build(self, capacity):
+        """ Monta as árvores em O(n), com espaço para capacity vagas """
+        keys = [self._keys(b) for b in self.boxes]
+        self.capacity = capacity
+        self.first, self.taxed, self.notax = FirstFitTree(capacity), FirstFitTree(capacity), NoTaxFitTree(capacity)
+        self.first.fill([k[0] for k in keys])
+        self.taxed.fill([k[1] for k in keys])
+        self.notax.fill([k[2] for k in keys], [k[3] for k in keys])
+        self.rooms = [k[0] for k in keys]
+        self.best = sorted((room, s) for s, room in enumerate(self.rooms) if room >= 0)
+
+    def valid_for(self, boxes, box_size, min_tax):
+        """ Se o índice ainda descreve essa lista de caixas """
+        return self.source is boxes and self.live == len(boxes) and \
+               self.box_size == box_size and self.min_tax == min_tax
+
+    def refresh(self, s):
+        """ Atualiza as árvores depois que a caixa da vaga s mudou """
+        room, taxed, notax, value_room = self._keys(self.boxes[s])
+        self.first.update(s, room)
+        self.taxed.update(s, taxed)
+        self.notax.update(s, notax, value_room)
+        old = self.rooms[s]
+        if old != room:
+            if old >= 0: del self.best[bisect_left(self.best, (old, s))]
+            if room >= 0: insort(self.best, (room, s))
+            self.rooms[s] = room
+
+    def new_slot(self, box):
+        """ Coloca uma caixa numa vaga nova, no fim; retorna a vaga """
+        self.boxes.append(box)
+        self.rooms.append(-1)
+        self.live += 1
+        if len(self.boxes) > self.capacity: self._build(2 * self.capacity)
+        s = len(self.boxes) - 1
+        self.refresh(s)
+        return s
+
+    def bury(self, s):
+        """ Transforma a vaga s numa lápide """
+        self.boxes[s] = None
+        self.live -= 1
+        self.refresh(s)
+
+    def items(self):
+        """ Monta (uma vez) os mapas de item para vaga, usados nas retiradas """
+        if self.where is None:
+            self.where, self.kinds = {}, {}
+            for s, b in enumerate(self.boxes):
+                if b is not None:
+                    for m in b.items: self.put(m, s)
+        return self.kinds
+
+    def put(self, item, s):
+        if self.where is None: return
+        self.where[id(item)] = s
+        slots = self.kinds.setdefault((item.size, item.value), {})
+        slots[s] = slots.get(s, 0) + 1
+
+    def take(self, item, s):
+        if self.where is None: return
+        if self.where.get(id(item)) == s: del self.where[id(item)]
+        slots = self.kinds[(item.size, item.value)]
+        slots[s] -= 1
+        if not slots[s]:
+            del slots[s]
+            if not slots: del self.kinds[(item.size, item.value)]
+
+    def owner(self, item):
+        """ Vaga da caixa que tem o próprio objeto item, ou -1 """
+        self.items()
+        s = self.where.get(id(item), -1)
+        if s >= 0 and self.boxes[s] is not None and any(m is item for m in self.boxes[s].items): return s
+        return -1
+
+    def similar(self, item):
+        """ Primeira vaga com um item de mesmo tamanho e valor, ou -1 """
+        slots = self.items().get((item.size, item.value))
+        return min(slots) if slots else -1
+
+    def choose(self, item, fit='first'):
+        """ Mesma escolha (e mesmo desempate) de choose_box, pelas árvores:
+        vaga ou -1 """
+        if fit == 'avoidtaxes':
+            if item.value <= self.min_tax: return self.notax.find(item.size, item.value)
+            return self.taxed.find(item.size)
+        if fit == 'best':
+            pos = bisect_left(self.best, (item.size, -1))
+            return self.best[pos][1] if pos < len(self.best) else -1
+        if fit == 'worst':
+            top = self.first.tree[1] # maior espaço livre
+            return self.first.find(top) if top >= item.size else -1
+        return self.first.find(item.size)
+
+    def partners(self, s):
+        """ Caixas candidatas a receber a caixa s inteira: a primeira, a mais
+        cheia e a mais vazia onde ela cabe, e a primeira que a mantém sem
+        taxa (ou, se ela é taxada, a primeira taxada) """
+        b = self.boxes[s]
+        self.first.update(s, -1); self.taxed.update(s, -1); self.notax.update(s, -1, -1)
+        found = [self.first.find(b.used_size)]
+        pos = bisect_left(self.best, (b.used_size, -1))
+        while pos < len(self.best) and self.best[pos][1] == s: pos += 1
+        if pos < len(self.best): found.append(self.best[pos][1])
+        top = self.first.tree[1]
+        if top >= b.used_size: found.append(self.first.find(top))
+        if b.total_value > self.min_tax: found.append(self.taxed.find(b.used_size))
+        else: found.append(self.notax.find(b.used_size, b.total_value))
+        self.refresh(s)
+        return [j for j in dict.fromkeys(found) if j >= 0]
+
+
+class _Amendment:
+    """ _Amendment (Classe): cópia sob demanda (copy-on-write) das caixas de
+    um Result, sobre o BoxIndex da solução. Só as caixas alteradas são
+    copiadas; as outras continuam compartilhadas com a solução original, que
+    não é modificada. Guarda o lucro que cada caixa tinha antes de ser
+    alterada, para que o lucro final seja calculado apenas pela diferença.
+    As posições usadas aqui são as vagas do índice. O índice da solução
+    original é reaproveitado: enquanto é alterado ele não descreve nenhuma
+    lista (source = None), então o Result original deixa de usá-lo """
+
+    def __init__(self, result, taxrate=10, min_tax=50):
+        boxes = result.list_of_boxes
+        if isinstance(boxes, PackedSolution): boxes = boxes.to_boxes()
+        box_size = boxes[0].total_size if boxes else 1000
+        index = getattr(result, '_index', None)
+        if index is None or not index.valid_for(boxes, box_size, min_tax) or len(index.boxes) > 2 * index.live + 16:
+            index = BoxIndex(boxes, box_size, min_tax) # O(n), só sem índice válido ou com muitas lápides
+        index.source = None # o índice passa a descrever a nova solução
+        self.source = boxes
+        self.result = result
+        self.index = index
+        self.boxes = index.boxes # vaga -> caixa, None marca uma caixa removida
+        self.box_size = box_size
+        self.taxrate, self.min_tax = taxrate, min_tax
+        self.before = {} # vaga -> lucro original da caixa alterada
+        self.touched = [] # vagas alteradas, na ordem em que foram alteradas
+
+    def profit_of(self, used_size, total_value):
+        return box_profit(used_size, total_value, tax_rate=self.taxrate, min_tax=self.min_tax)
+
+    def cancel(self):
+        """ Desiste antes de alterar qualquer caixa: o índice volta a valer
+        para a solução original """
+        self.index.source = self.source
+
+    def writable(self, k):
+        """ Caixa da vaga k pronta para ser alterada (copiada na 1ª vez) """
+        if k not in self.before:
+            b = self.boxes[k]
+            self.before[k] = self.profit_of(b.used_size, b.total_value)
+            self.boxes[k] = b.copy()
+            self.touched.append(k)
+        return self.boxes[k]
+
+    def new_box(self):
+        """ Abre uma caixa nova no fim, retorna sua vaga """
+        k = self.index.new_slot(Box(self.box_size))
+        self.before[k] = 0
+        self.touched.append(k)
+        return k
+
+    def add(self, k, item):
+        """ Coloca o item na caixa da vaga k """
+        self.writable(k).add_item(item)
+        self.index.put(item, k)
+        self.index.refresh(k)
+
+    def remove(self, k, item):
+        """ Retira o item (ou o primeiro de mesmo tamanho e valor) da caixa da
+        vaga k, retorna o item retirado """
+        m = self.writable(k).remove_item(item)
+        self.index.take(m, k)
+        self.index.refresh(k)
+        return m
+
+    def drop(self, k):
+        """ Remove a caixa da vaga k """
+        self.writable(k)
+        self.index.bury(k)
+
+    def to_result(self):
+        """ Monta o Result final, com o lucro calculado pelas caixas alteradas.
+        O índice vai junto, para a próxima alteração """
+        result = self.result
+        profit = result.profit if result.profit != '' else calc_profit(result.list_of_boxes, self.taxrate, self.min_tax)
+        for k in self.touched: # caixas esvaziadas sem o repair
+            if self.boxes[k] is not None and not self.boxes[k].items: self.index.bury(k)
+        for k, old in self.before.items():
+            b = self.boxes[k]
+            profit -= old
+            if b is not None: profit += self.profit_of(b.used_size, b.total_value)
+        boxes = list(filter(None, self.boxes))
+        new_result = Result(list_of_boxes=boxes, fit_order=result.fit_order, sort_order=result.sort_order, \
+                            nb_algo='incremental', box_amount=len(boxes), profit=profit)
+        self.index.source = boxes
+        new_result._index = self.index
+        return new_result
+
+
+def local_repair(amendment, positions):
+    """ Busca local restrita às caixas alteradas: aplica os mesmos movimentos
+    do nbhood (juntar duas caixas, como o repack, e partir uma caixa em duas
+    metades, como o top_to_bottom) enquanto algum deles melhorar o lucro.
+    As caixas que podem receber uma caixa inteira vêm do índice
+    (BoxIndex.partners), então cada tentativa custa O(log n) """
+    boxes, index, profit_of = amendment.boxes, amendment.index, amendment.profit_of
+    pending = list(dict.fromkeys(positions))
+    while pending:
+        k = pending.pop()
+        b = boxes[k]
+        if b is None: continue
+        if not b.items: amendment.drop(k); continue
+        p = profit_of(b.used_size, b.total_value)
+
+        # juntar: a caixa k vai inteira para a candidata onde o ganho for maior
+        best_gain, best_j = 0, -1
+        for j in index.partners(k):
+            other = boxes[j]
+            gain = profit_of(other.used_size + b.used_size, other.total_value + b.total_value) \
+                   - profit_of(other.used_size, other.total_value) - p
+            if gain > best_gain: best_gain, best_j = gain, j
+        if best_j >= 0:
+            for m in list(b.items):
+                amendment.remove(k, m)
+                amendment.add(best_j, m)
+            amendment.drop(k)
+            pending.append(best_j)
+            continue
+
+        # partir: as duas metades da caixa, pela ordem dos itens
+        half = len(b.items)//2
+        if half:
+            size1 = sum(m.size for m in b.items[:half]); value1 = sum(m.value for m in b.items[:half])
+            if profit_of(size1, value1) + profit_of(b.used_size - size1, b.total_value - value1) > p:
+                moved = b.items[half:]
+                n = amendment.new_box()
+                for m in moved: amendment.add(n, amendment.remove(k, m))
+                pending += [k, n]
+
+
+def add_items(result, items, taxrate=10, fit=None, min_tax=50, repair=True):
+    """ Acrescenta itens a uma solução existente, sem refazer o fit e o vnd:
+    cada item entra numa caixa pela política do fit (por padrão, a mesma
+    usada na solução, result.fit_order), escolhida pelo BoxIndex, e com
+    repair as caixas alteradas passam pela busca local. A solução original
+    não é alterada. O custo é proporcional ao número de itens acrescentados
+    (vezes log n), exceto na primeira alteração, que monta o índice.
+    Retorna um novo Result """
+    amendment = _Amendment(result, taxrate, min_tax)
+    fit = fit or result.fit_order or 'first'
+    for item in items:
+        k = amendment.index.choose(item, fit)
+        if k < 0: k = amendment.new_box()
+        amendment.add(k, item)
+    if repair: local_repair(amendment, amendment.touched)
+    return amendment.to_result()
+
+
+def remove_items(result, items, taxrate=10, min_tax=50, repair=True):
+    """ Retira itens de uma solução existente, atualizando os totais das
+    caixas, e com repair tenta juntar/partir as caixas que ficaram mais
+    vazias. Os itens são procurados pelo próprio objeto e, se não forem
+    achados, pelo primeiro de mesmo tamanho e valor, ambos pelo BoxIndex.
+    A solução original não é alterada. Retorna um novo Result """
+    amendment = _Amendment(result, taxrate, min_tax)
+    index = amendment.index
+    found, rest, taken = [], [], set() # (vaga, item) achados pelo objeto; os outros
+    for item in items:
+        k = index.owner(item)
+        if k >= 0 and id(item) not in taken: found.append((k, item)); taken.add(id(item))
+        else: rest.append(item)
+    # confere antes de alterar: sobram itens iguais suficientes para os outros?
+    missing = Counter((m.size, m.value) for m in rest)
+    if missing:
+        found_kinds = Counter((m.size, m.value) for _, m in found)
+        kinds = index.items()
+        missing -= Counter({key: sum(kinds.get(key, {}).values()) - found_kinds[key] for key in missing})
+    if missing:
+        amendment.cancel() # nada foi alterado, o índice continua valendo
+        raise ValueError("itens não encontrados na solução: " + str(+missing))
+    for k, m in found: amendment.remove(k, m)
+    for item in rest: amendment.remove(index.similar(item), item)
+    if repair: local_repair(amendment, amendment.touched)
+    return amendment.to_result()
+
+
+#------------------------------------------------------------------------------#
+#   Busca em Vizinhança Grande (ALNS)                                          #
+# -----------------------------------------------------------------------------#
+
+
+DESTROY_OPTIONS = ['random', 'least_profit', 'near_threshold']
+REPAIR_OPTIONS = ['first', 'best', 'worst', 'avoidtaxes']
+
+
+def destroy_boxes(boxes, pool, amount, how, profit_of, min_tax=50, rng=random):
+    """ Escolhe, entre as caixas da amostra pool, as amount caixas a esvaziar:
+        'random' - ao acaso
+        'least_profit' - as de menor lucro
+        'near_threshold' - as taxadas com o valor mais perto do min_tax, que
+                           talvez deixem de ser taxadas ao perder um item """
+    if how == 'least_profit':
+        pool = sorted(pool, key=lambda k: profit_of(boxes[k].used_size, boxes[k].total_value))
+    elif how == 'near_threshold':
+        taxed = [k for k in pool if boxes[k].total_value > min_tax]
+        pool = sorted(taxed, key=lambda k: boxes[k].total_value) or pool
+    else: pool = rng.sample(pool, len(pool))
+    return pool[:amount]
+
+
+def repair_items(boxes, freed, candidates, fit='first', min_tax=50, changed=None):
+    """ Recoloca os itens liberados pela política do fit, só nas caixas
+    candidatas (e em caixas novas). As candidatas que recebem itens são
+    copiadas antes (copy-on-write). Retorna as caixas alteradas/novas como
+    {posição: caixa anterior ou None}, preenchendo changed se for dado """
+    if changed is None: changed = {}
+    box_size = boxes[candidates[0]].total_size if candidates else 1000
+    local = [boxes[k] for k in candidates]
+    for item in sorted(freed, key=attrgetter('size'), reverse=True):
+        j = choose_box(local, item, fit, min_tax)
+        if j < 0:
+            boxes.append(Box(box_size)); candidates.append(len(boxes) - 1)
+            changed[len(boxes) - 1] = None
+            local.append(boxes[-1]); j = len(local) - 1
+        k = candidates[j]
+        if k not in changed:
+            changed[k] = boxes[k]
+            boxes[k] = local[j] = boxes[k].copy()
+        local[j].add_item(item)
+    return changed
+
+
+def undo_move(boxes, undo, changed):
+    """ Restaura as caixas anteriores a um movimento do alns e remove as
+    caixas novas (que estão sempre no fim da lista) """
+    for k, old in changed.items():
+        if old is not None: boxes[k] = old
+    for k, old in undo.items(): boxes[k] = old
+    for k in sorted((k for k, old in changed.items() if old is None), reverse=True): boxes.pop(k)
+
+
+def alns(solution, taxrate=10, min_tax=50, iterations=2000, destroy_fraction=0.02, max_destroy=20, \
+         sample=64, reaction=0.2, segment=50, randomseed="i_will_survive_this", time_limit=None, \
+         stats=None, on_improve=None, gap=None, bounds=None, verbose=False):
+    """ Busca Adaptativa em Vizinhança Grande: a cada iteração, esvazia algumas
+    caixas (destroy_fraction das caixas, no máximo max_destroy) e recoloca os
+    seus itens com uma das políticas do fit. Ao contrário do top_to_bottom e
+    do repack, move itens individuais entre caixas.
+    As caixas a esvaziar e as candidatas a receber os itens saem de uma
+    amostra de sample caixas, então cada iteração custa o mesmo qualquer que
+    seja o tamanho da solução. O lucro é atualizado só pelas caixas alteradas
+    e, se o movimento piorar a solução, as caixas antigas são restauradas.
+    Os operadores (destroy x repair) são sorteados por pesos que se adaptam
+    a cada segment iterações (reaction: quanto do peso vem do último trecho):
+    achar uma nova melhor vale 3 pontos, uma solução igual ou melhor vale 1.
+    stats, on_improve, gap, bounds: como no vnd. Retorna o melhor Result """
+    if stats is True: stats = SearchStats()
+    rng = random.Random(randomseed) # sem mexer no estado global do random
+    budget = SearchBudget(time_limit) if time_limit is not None else None
+    if gap is not None and bounds is None: bounds = solution_bounds(solution.list_of_boxes, taxrate, min_tax)
+    profit_of = lambda u, v: box_profit(u, v, tax_rate=taxrate, min_tax=min_tax)
+    start_boxes = solution.list_of_boxes
+    if isinstance(start_boxes, PackedSolution): start_boxes = start_boxes.to_boxes()
+    boxes = [b for b in start_boxes if b.items] # lista de trabalho; None marca uma caixa esvaziada
+    profit = sum(profit_of(b.used_size, b.total_value) for b in boxes)
+    best_profit = profit # só movimentos que não pioram são aceitos: a atual é sempre a melhor
+    alive, holes = len(boxes), 0
+    destroy_w = dict.fromkeys(DESTROY_OPTIONS, 1.0)
+    repair_w = dict.fromkeys(REPAIR_OPTIONS, 1.0)
+    scores, uses = Counter(), Counter() # pontos e usos de cada operador no trecho atual
+
+    it, undo, changed = 0, None, None
+    try:
+        for it in range(iterations):
+            if budget is not None and budget.exhausted(): break
+            if alive < 2: break
+            how = rng.choices(DESTROY_OPTIONS, [destroy_w[o] for o in DESTROY_OPTIONS])[0]
+            policy = rng.choices(REPAIR_OPTIONS, [repair_w[o] for o in REPAIR_OPTIONS])[0]
+            amount = max(1, min(max_destroy, int(destroy_fraction * alive)))
+            pool = set()
+            for _ in range(4 * min(sample, alive)): # amostra de caixas vivas
+                k = rng.randrange(len(boxes))
+                if boxes[k] is not None: pool.add(k)
+                if len(pool) >= min(sample, alive): break
+            pool = sorted(pool)
+            destroyed = destroy_boxes(boxes, pool, amount, how, profit_of, min_tax, rng)
+            if not destroyed: continue
+            gone = set(destroyed)
+            candidates = [k for k in pool if k not in gone]
+
+            old_part = 0 # lucro das caixas alteradas antes do movimento
+            freed, undo, changed = [], {}, {}
+            for k in destroyed:
+                old_part += profit_of(boxes[k].used_size, boxes[k].total_value)
+                freed += boxes[k].items
+                undo[k] = boxes[k]; boxes[k] = None
+            repair_items(boxes, freed, candidates, policy, min_tax, changed)
+            new_part = 0
+            for k, old in changed.items():
+                if old is not None: old_part += profit_of(old.used_size, old.total_value); undo[k] = old
+                new_part += profit_of(boxes[k].used_size, boxes[k].total_value)
+            new_profit = profit - old_part + new_part
+            if stats is not None: stats.neighbours += 1
+
+            uses[how] += 1; uses[policy] += 1
+            if new_profit >= profit: # aceita (empates permitem andar em platôs)
+                opened = sum(1 for old in changed.values() if old is None)
+                alive += opened - len(destroyed); holes += len(destroyed)
+                improved = new_profit > best_profit
+                scores[how] += 3 if improved else 1; scores[policy] += 3 if improved else 1
+                profit = new_profit
+                if improved:
+                    if stats is not None: stats.accepted += 1
+                    best_profit = profit
+                    if verbose: print("> ALNS " + str(it) + ": " + str(profit) + " (" + how + ", " + policy + ")")
+                    if on_improve is not None:
+                        current = [b for b in boxes if b is not None]
+                        if on_improve(Result(list_of_boxes=current, profit=profit, box_amount=len(current))) is False: break
+                    if bounds is not None and bounds.reached(profit, gap): break
+            else: undo_move(boxes, undo, changed) # rejeita: desfaz o movimento
+            undo = changed = None
+            if holes > alive: # compacta a lista quando metade dela são buracos
+                boxes = [b for b in boxes if b is not None]; holes = 0
+
+            if (it + 1) % segment == 0: # atualiza os pesos dos operadores
+                for weights in (destroy_w, repair_w):
+                    for o in weights:
+                        if uses[o]: weights[o] = (1 - reaction) * weights[o] + reaction * scores[o] / uses[o] + 1e-3
+                scores, uses = Counter(), Counter()
+    except KeyboardInterrupt: # interrompido: desfaz o movimento pela metade, fica com a melhor
+        if undo is not None:
+            undo_move(boxes, undo, changed)
+            best_profit = sum(profit_of(b.used_size, b.total_value) for b in boxes if b is not None)
+
+    if stats is not None: stats.neighbourhoods += it + 1
+    best_boxes = [b for b in boxes if b is not None]
+    result = Result(list_of_boxes=best_boxes, fit_order=solution.fit_order, sort_order=solution.sort_order, \
+                    nb_algo='alns', box_amount=len(best_boxes), profit=best_profit, stats=stats)
+    if verbose:
+        print("Melhoria: " + str(solution.profit) + " ---> " + str(best_profit))
+        print("Pesos: " + str({k: round(v, 2) for k, v in destroy_w.items()}) + " " + \
+              str({k: round(v, 2) for k, v in repair_w.items()}))
+    return result
@@ -0,0 +1,258 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" service.py - serviço assíncrono (asyncio) de empacotamento, com os
+cálculos em processos separados e agrupamento de pedidos pequenos """
+
+import json, time, asyncio, argparse, traceback
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from data import Item, load_items
+from heuristic import multifit, vnd
+
+
+#------------------------------------------------------------------------------#
+#   Processos de Trabalho                                                      #
+# -----------------------------------------------------------------------------#
+
+
+def solve_job(sizes, values, taxrate=10, algo='auto', time_limit=None):
+    """ Resolve um pedido (multifit + vnd) e retorna um dicionário simples,
+    que pode voltar do processo sem levar objetos Box """
+    start = time.perf_counter()
+    items = [Item(s, v) for s, v in zip(sizes, values)]
+    initial = multifit(items=items, taxrate=taxrate)
+    remaining = None if time_limit is None else max(time_limit - (time.perf_counter() - start), 0)
+    final = vnd(initial, taxrate=taxrate, algo=algo, time_limit=remaining)
+    return {'status': 'ok', 'profit': final.profit, 'box_amount': final.box_amount, \
+            'fit_order': final.fit_order, 'sort_order': final.sort_order, \
+            'boxes': [[(m.size, m.value) for m in b.items] for b in final.list_of_boxes], \
+            'solve_time': time.perf_counter() - start}
+
+
+def solve_many(payloads):
+    """ Resolve um lote de pedidos num único envio ao processo. Um pedido com
+    erro vira um registro 'error', sem derrubar os outros do lote """
+    answers = []
+    for payload in payloads:
+        try: answers.append(solve_job(**payload))
+        except Exception as e:
+            answers.append({'status': 'error', 'error': repr(e), 'traceback': traceback.format_exc()})
+    return answers
+
+
+#------------------------------------------------------------------------------#
+#   Serviço                                                                    #
+# -----------------------------------------------------------------------------#
+
+
+class ServiceBusy(Exception):
+    """ A fila do serviço está cheia (submit_nowait) """
+
+
+class ServiceMetrics:
+    """ ServiceMetrics (Classe): contadores e latências do serviço. As
+    latências guardadas são as das últimas window requisições """
+
+    def __init__(self, window=1000):
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0 # recusadas com a fila cheia
+        self.batches = 0 # envios aos processos
+        self.batched_jobs = 0 # pedidos enviados nesses envios
+        self.wait = deque(maxlen=window) # tempo na fila
+        self.latency = deque(maxlen=window) # tempo total, do envio à resposta
+
+    @staticmethod
+    def _summary(values):
+        if not values: return {'count': 0}
+        ordered = sorted(values)
+        pick = lambda q: ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+        return {'count': len(ordered), 'mean': sum(ordered) / len(ordered), 'p50': pick(0.5), \
+                'p95': pick(0.95), 'max': ordered[-1]}
+
+    def as_dict(self):
+        return {'submitted': self.submitted, 'completed': self.completed, 'failed': self.failed, \
+                'rejected': self.rejected, 'batches': self.batches, \
+                'jobs_per_batch': self.batched_jobs / self.batches if self.batches else 0.0, \
+                'queue_wait': self._summary(self.wait), 'latency': self._summary(self.latency)}
+
+
+class PackingService:
+    """ PackingService (Classe): recebe pedidos de empacotamento (itens e
+    parâmetros da taxa) numa fila limitada e os resolve num executor de
+    processos, sem bloquear o loop do asyncio.
+    Parametros:
+        workers: processos do executor (None = todos os núcleos)
+        max_queue: tamanho da fila; com ela cheia, submit espera (contrapressão)
+                   e submit_nowait recusa com ServiceBusy
+        batch_size, batch_window: pedidos pequenos que chegam com até
+                   batch_window segundos de diferença vão juntos para o
+                   mesmo processo, até batch_size pedidos por envio
+        small_job: até quantos itens um pedido é considerado pequeno
+        executor: executor próprio (ex: ThreadPoolExecutor, para testes no
+                  mesmo processo); None cria um ProcessPoolExecutor """
+
+    def __init__(self, workers=None, max_queue=1000, batch_size=16, batch_window=0.005, \
+                 small_job=500, executor=None):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.batch_window = batch_window
+        self.small_job = small_job
+        self.executor = executor
+        self._own_executor = executor is None
+        self.metrics = ServiceMetrics()
+        self.queue = None
+        self._dispatcher = None
+        self._running = set() # envios em andamento
+        self._slots = None # limita os envios simultâneos ao número de processos
+
+    async def start(self):
+        """ Cria a fila, o executor e a tarefa que despacha os pedidos """
+        if self.executor is None: self.executor = ProcessPoolExecutor(max_workers=self.workers)
+        self.queue = asyncio.Queue(self.max_queue)
+        self._slots = asyncio.Semaphore(self.workers or getattr(self.executor, '_max_workers', 1))
+        self._dispatcher = asyncio.create_task(self._dispatch())
+        return self
+
+    async def stop(self):
+        """ Espera os pedidos na fila e em andamento, e encerra o executor """
+        if self._dispatcher is None: return
+        await self.queue.join()
+        self._dispatcher.cancel()
+        try: await self._dispatcher
+        except asyncio.CancelledError: pass
+        if self._running: await asyncio.gather(*self._running, return_exceptions=True)
+        if self._own_executor:
+            self.executor.shutdown()
+            self.executor = None
+        self._dispatcher = None
+
+    async def __aenter__(self): return await self.start()
+
+    async def __aexit__(self, *exc): await self.stop()
+
+    def queue_depth(self):
+        """ Pedidos esperando na fila """
+        return self.queue.qsize() if self.queue is not None else 0
+
+    def snapshot(self):
+        """ Métricas atuais, com a profundidade da fila e os envios em andamento """
+        metrics = self.metrics.as_dict()
+        metrics['queue_depth'] = self.queue_depth()
+        metrics['in_flight'] = len(self._running)
+        return metrics
+
+    def _job(self, items, taxrate, algo, time_limit):
+        sizes = [i.size if isinstance(i, Item) else i[0] for i in items]
+        values = [i.value if isinstance(i, Item) else i[1] for i in items]
+        payload = {'sizes': sizes, 'values': values, 'taxrate': taxrate, 'algo': algo, \
+                   'time_limit': time_limit}
+        return payload, asyncio.get_running_loop().create_future(), time.perf_counter()
+
+    async def submit(self, items, taxrate=10, algo='auto', time_limit=None):
+        """ Envia um pedido e espera a resposta. Se a fila estiver cheia,
+        espera uma vaga. Os itens podem ser Item ou pares (tamanho, valor) """
+        job = self._job(items, taxrate, algo, time_limit)
+        self.metrics.submitted += 1
+        await self.queue.put(job)
+        return await job[1]
+
+    async def submit_nowait(self, items, taxrate=10, algo='auto', time_limit=None):
+        """ Como submit, mas recusa o pedido (ServiceBusy) se a fila estiver cheia """
+        job = self._job(items, taxrate, algo, time_limit)
+        try: self.queue.put_nowait(job)
+        except asyncio.QueueFull:
+            self.metrics.rejected += 1
+            raise ServiceBusy("fila cheia: " + str(self.max_queue) + " pedidos")
+        self.metrics.submitted += 1
+        return await job[1]
+
+    async def _dispatch(self):
+        """ Tira os pedidos da fila e os agrupa: um pedido grande vai sozinho;
+        pequenos que chegam juntos vão no mesmo envio """
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._slots.acquire()
+            batch = [await self.queue.get()]
+            if len(batch[0][0]['sizes']) <= self.small_job:
+                deadline = loop.time() + self.batch_window
+                while len(batch) < self.batch_size:
+                    try: job = await asyncio.wait_for(self.queue.get(), max(deadline - loop.time(), 0))
+                    except asyncio.TimeoutError: break
+                    batch.append(job)
+                    if len(job[0]['sizes']) > self.small_job: break # o grande vai junto, sem esperar mais
+            task = asyncio.create_task(self._run(batch))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _run(self, batch):
+        """ Executa um lote no executor e entrega as respostas """
+        loop = asyncio.get_running_loop()
+        now = time.perf_counter()
+        for _, _, queued in batch: self.metrics.wait.append(now - queued)
+        self.metrics.batches += 1
+        self.metrics.batched_jobs += len(batch)
+        try:
+            answers = await loop.run_in_executor(self.executor, solve_many, [job[0] for job in batch])
+        except Exception as e: # o processo morreu: todos do lote falham
+            answers = [{'status': 'error', 'error': repr(e)}] * len(batch)
+        finally:
+            self._slots.release()
+        done = time.perf_counter()
+        for (_, future, queued), answer in zip(batch, answers):
+            self.metrics.latency.append(done - queued)
+            if answer['status'] == 'ok': self.metrics.completed += 1
+            else: self.metrics.failed += 1
+            if not future.done(): future.set_result(answer)
+            self.queue.task_done()
+
+
+#------------------------------------------------------------------------------#
+#   Cliente Local                                                              #
+# -----------------------------------------------------------------------------#
+
+
+class LocalClient:
+    """ LocalClient (Classe): cliente no mesmo processo, para testes e uso
+    local sem HTTP. Envia vários pedidos de uma vez e junta as respostas """
+
+    def __init__(self, service):
+        self.service = service
+
+    async def pack(self, items, taxrate=10, algo='auto', time_limit=None):
+        return await self.service.submit(items, taxrate, algo, time_limit)
+
+    async def pack_many(self, jobs):
+        """ jobs: lista de dicionários com items e, opcionalmente, taxrate,
+        algo e time_limit. As respostas voltam na mesma ordem """
+        return await asyncio.gather(*[self.pack(**job) for job in jobs])
+
+
+def run_local(jobs, **options):
+    """ Sobe o serviço, resolve os pedidos pelo LocalClient e o encerra.
+    Retorna (respostas, métricas) """
+    async def main():
+        async with PackingService(**options) as service:
+            answers = await LocalClient(service).pack_many(jobs)
+            return answers, service.snapshot()
+    return asyncio.run(main())
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serviço de empacotamento (cliente local)')
+    parser.add_argument('files', nargs='+', help='instâncias (JSON ou binário)')
+    parser.add_argument('--repeat', type=int, default=1, help='envia cada arquivo várias vezes')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--taxrate', type=int, default=10)
+    parser.add_argument('--time-limit', type=float, default=None)
+    args = parser.parse_args()
+
+    jobs = [{'items': load_items(f), 'taxrate': args.taxrate, 'time_limit': args.time_limit} \
+            for f in args.files for _ in range(args.repeat)]
+    answers, metrics = run_local(jobs, workers=args.workers)
+    for job, answer in zip(jobs, answers):
+        print(str(answer.get('profit')) + ' ' + str(answer.get('box_amount')) + ' ' + answer['status'])
+    print(json.dumps(metrics, indent=1))
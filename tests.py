@@ -4,10 +4,11 @@
 """ tests.py - testes de estresse e modo interativo """
 
 from heuristic import *  #pylint: disable=unused-wildcard-import 
-from operator import itemgetter, attrgetter
+from operator import attrgetter
 from data import Item, Box, load_from_file, save_to_file
 from sys import argv
-from IPython import embed
+from time import perf_counter
+import pickle
 
 
 #-----------------------------------------------------------#
@@ -24,23 +25,65 @@ def stresstest(itemgen=None, file=None,taxrate=False):
     print(str(totalitemsize) + ' ' + str(totalitemvalue))
 
     testtaxrate = taxrate if taxrate else [0,10,20,30,40,50,60]
-    fit_option = ['first','best','worst','avoidtaxes']
-    sort_option = [True, False, 'cheapest', 'expensive']
 
+    # os empacotamentos não dependem da taxa: são feitos uma vez só e avaliados em todas
+    best = sweep_best(sweep(my_items, tax_rates=testtaxrate))
     for t in testtaxrate:
-        results = {}
         print("TAX RATE: " + str(t), end=' ')
+        (f, s), profit, l = best[t, 50, 5, 0.005]
+        print(str((f, s, l)), str(profit))
+
+
+#-----------------------------------------------------------#
+# Benchmark do Fit Indexado                                 #
+#-----------------------------------------------------------#
+
+def benchfit(amounts=(1000, 5000, 20000), fit_option=('first','best','worst','avoidtaxes'), sortedlist=False):
+    """ Compara o fit indexado com a varredura original (fit_linear), conferindo
+    que as duas geram exatamente as mesmas caixas """
+    for amount in amounts:
+        random.seed(amount)
+        my_items = generate_item_list(amount=amount, max_size=1000, max_value=100)
         for f in fit_option:
-            for s in sort_option:
-                mybox = fit(my_items,fit=f,sortedlist=s,verbose=False)
-                l = len(mybox)
-                # n = fit_option.index(f) + (sort_option.index(s)*10)
-               # mysum = 0
-               # for x in mybox: mysum += x.used_size # rint(x.used_size, end=' ')
-                
-                results[f,s,l] = calc_profit(mybox, t)
-        for k, v in sorted(results.items(), key=itemgetter(1), reverse=True):
-            print(str(k), str(v));break
+            start = perf_counter()
+            fast = fit(my_items, fit=f, sortedlist=sortedlist)
+            t_fast = perf_counter() - start
+            start = perf_counter()
+            slow = fit_linear(my_items, fit=f, sortedlist=sortedlist)
+            t_slow = perf_counter() - start
+            same = [[id(i) for i in b.items] for b in fast] == [[id(i) for i in b.items] for b in slow]
+            print("%7d %-10s linear: %8.3fs indexado: %8.3fs (%6.1fx) %s" % (amount, f, t_slow, t_fast, \
+                  t_slow / max(t_fast, 1e-9), 'iguais' if same else 'DIFERENTES'))
+
+
+#-----------------------------------------------------------#
+# Serialização de Resultados                                #
+#-----------------------------------------------------------#
+
+def roundtrip(amounts=(0, 1, 200, 5000), taxrate=10):
+    """ Confere que Result.to_bytes/from_bytes (e o pickle comum) devolvem
+    as mesmas caixas, para listas de Box e PackedSolution, e compara
+    o tamanho com o pickle dos objetos Box/Item """
+    def boxes_of(r):
+        boxes = r.list_of_boxes.to_boxes() if isinstance(r.list_of_boxes, PackedSolution) else r.list_of_boxes
+        return [(b.total_size, b.used_size, b.total_value, [(m.size, m.value) for m in b.items]) for b in boxes]
+    def fields(r):
+        return (r.fit_order, r.sort_order, r.nb_algo, r.nb_order, r.nb_pos, r.box_amount, r.profit)
+    for amount in amounts:
+        random.seed(amount)
+        my_items = generate_item_list(amount=amount, max_size=1000, max_value=100)
+        for packed in (False, True):
+            result = vnd(multifit(items=my_items, taxrate=taxrate, packed=packed), taxrate=taxrate, stats=True) \
+                     if amount else Result(list_of_boxes=PackedSolution([], []) if packed else [], profit=0, box_amount=0)
+            data = result.to_bytes()
+            for copy in (Result.from_bytes(data), pickle.loads(pickle.dumps(result))):
+                assert boxes_of(copy) == boxes_of(result), (amount, packed)
+                assert fields(copy) == fields(result), (amount, packed)
+                assert isinstance(copy.list_of_boxes, PackedSolution) == packed
+            full = len(pickle.dumps(result.__dict__)) # o grafo de objetos, como antes
+            print("%6d itens %-6s bytes: %8d pickle dos objetos: %8d (%5.1fx)" % (amount, \
+                  'packed' if packed else 'box', len(data), full, full / len(data)))
+    print("ok")
 
 
 #-----------------------------------------------------------#
@@ -82,7 +125,11 @@ if __name__ == '__main__':
     if '--random-gen' in argv: generate_item_list(amount=200,max_size=1000,max_value=100,savefile='random.txt');print("Lista Aleatória Gerada")
     if '--pareto-gen' in argv: generate_pareto_list(amount=200, medium_size=400, medium_value=50, max_size=1000,max_value=100,savefile='pareto.txt')
     if '--stress' in argv: stresstest(file=argv[2])
-    if '-i' in argv: embed()
+    if '--bench-fit' in argv: benchfit()
+    if '--roundtrip' in argv: roundtrip()
+    if '-i' in argv:
+        from IPython import embed # só carregado no modo interativo
+        embed()
     if 'idk' in argv: vnd(nbhood(multifit(file='pareto.txt',taxrate=10,verbose=True),taxrate=10,verbose=True),taxrate=10,verbose=True)
     if 'wtflol' in argv:  smarter_vnd(nbhood(multifit(file='random.txt',taxrate=20,verbose=True),taxrate=20,verbose=True,meta=True),taxrate=20,verbose=True)
     #stresstest('pareto')